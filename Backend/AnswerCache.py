@@ -0,0 +1,191 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+try:
+    import numpy as np
+except ImportError:  # Similarity matching is optional; exact matches still work
+    np = None
+
+# --- ANSWER CACHE FOR GENERAL QUERIES ---
+# Context-free questions ("what is python programming language?") are answered
+# once and reused: first by exact match on the normalized query, then (optionally,
+# with NumPy) by cosine similarity of hashed word/character n-gram vectors.
+# Entries expire after a TTL, the least recently used are evicted, and concurrent
+# identical requests share a single upstream completion.
+
+# Queries referring to earlier turns or to the current moment are never cached
+_CONTEXTUAL_RE = re.compile(
+    r"\b(he|she|him|her|his|hers|it|its|they|them|their|this|that|these|those|above|previous|"
+    r"again|more|continue|else|too|also|same|today|tonight|now|time|date|day|yesterday|tomorrow|"
+    r"my|mine|me|i|we|our|us|you|your)\b"
+)
+# ...except in these common phrasings where the pronoun is not a back-reference
+_ALLOWED_RE = re.compile(r"^(what is|what are|explain|define|how (do|does|to|can)|tell me about|give me)\b")
+# Questions whose answer changes over time (the same classes SearchCache treats as news)
+_VOLATILE_RE = re.compile(
+    r"\b(news|latest|current(ly)?|recent(ly)?|weather|forecast|temperature|president|prime minister|ceo|"
+    r"price|prices|cost|stock|rate|score|scores|live|headlines?|update|this (week|month|year)|"
+    r"last (week|month|year)|next (week|month|year))\b"
+)
+# Similar queries only share an answer when they mention the same numbers ("2 plus 2" vs "2 plus 3")
+_NUMBER_RE = re.compile(
+    r"\d+|\b(zero|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|thirteen|fourteen|fifteen|"
+    r"sixteen|seventeen|eighteen|nineteen|twenty|thirty|forty|fifty|sixty|seventy|eighty|ninety|hundred|"
+    r"thousand|million|billion|first|second|third|half|twice|double)\b"
+)
+
+# Words that don't change what is asked; a similarity hit must share every other word
+_STOP_WORDS = frozenset(
+    "a an the is are was were be of in on at to for from by with about and or what whats which who how "
+    "do does did can could would should please tell me give explain define describe".split()
+)
+
+VECTOR_DIMS = 4096
+
+
+def NormalizeQuery(query):
+    """Folds case, apostrophes, punctuation and whitespace."""
+    return " ".join(re.sub(r"[^\w\s]+", " ", re.sub(r"['’]", "", query.lower())).split())
+
+
+def IsContextFree(query):
+    """True when the answer can't depend on the conversation so far or on the current time."""
+    text = NormalizeQuery(query)
+    if not text or _VOLATILE_RE.search(text):
+        return False
+    if _ALLOWED_RE.match(text):
+        # Only the leading "tell me"/"give me" is exempt; the rest must still be self-contained
+        text = _ALLOWED_RE.sub("", text)
+    return not _CONTEXTUAL_RE.search(text)
+
+
+def NumberTokens(text):
+    """The numbers in a normalized query, in order (digits and number words)."""
+    return [match.group() for match in _NUMBER_RE.finditer(text)]
+
+
+def ContentWords(text):
+    """The words of a normalized query that carry its meaning (stop words dropped)."""
+    return frozenset(word for word in text.split() if word not in _STOP_WORDS)
+
+
+def _features(text):
+    words = text.split()
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {text} "
+    grams += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    return grams
+
+
+def HashedVector(text):
+    """L2-normalised hashed n-gram vector with sublinear term weights (requires NumPy)."""
+    counts = {}
+    for gram in _features(text):
+        index = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=4).digest(), "little") % VECTOR_DIMS
+        counts[index] = counts.get(index, 0) + 1
+    vector = np.zeros(VECTOR_DIMS, dtype=np.float32)
+    for index, count in counts.items():
+        vector[index] = 1.0 + np.log(count)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    """LRU + TTL cache of answers with optional similarity lookup and in-flight coalescing."""
+
+    def __init__(self, maxsize=512, ttl=86400.0, similarity=0.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity = similarity if np is not None else 0.0  # 0 disables similarity matching
+        self._entries = OrderedDict()  # key -> (expires_at, answer)
+        self._keys = []  # Row order of self._matrix
+        self._matrix = None
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "coalesced": 0}
+
+    def get_or_compute(self, query, compute):
+        """Returns (answer, source) where source is 'exact', 'similar', 'coalesced' or 'computed'."""
+        key = NormalizeQuery(query)
+        owner = False
+        with self._lock:
+            answer = self._lookup(key)
+            if answer is not None:
+                self.stats["exact_hits"] += 1
+                return answer, "exact"
+            similar = self._similar(key)
+            if similar is not None:
+                self.stats["similar_hits"] += 1
+                return self._entries[similar][1], "similar"
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+            else:
+                future = self._in_flight[key] = Future()
+                self.stats["misses"] += 1
+                owner = True
+        if not owner:
+            return future.result(), "coalesced"
+
+        try:
+            answer = compute()
+        except Exception as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._store(key, answer)
+            del self._in_flight[key]
+        future.set_result(answer)
+        return answer, "computed"
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), similarity=self.similarity)
+
+    # --- Internals (called with the lock held) ---
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _similar(self, key):
+        if not self.similarity or self._matrix is None or not self._keys:
+            return None
+        scores = self._matrix @ HashedVector(key)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        match = self._keys[best]
+        if NumberTokens(match) != NumberTokens(key) or ContentWords(match) != ContentWords(key):
+            return None  # "capital of austria" must never answer "capital of australia", nor 2023 answer 2024
+        return match if self._lookup(match) is not None else None
+
+    def _store(self, key, answer):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, answer)
+        if self.similarity:
+            row = HashedVector(key)[None, :]
+            self._matrix = row if self._matrix is None else np.vstack([self._matrix, row])
+            self._keys.append(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        del self._entries[key]
+        if self.similarity and key in self._keys:
+            index = self._keys.index(key)
+            del self._keys[index]
+            self._matrix = np.delete(self._matrix, index, axis=0)
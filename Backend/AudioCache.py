@@ -0,0 +1,139 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# --- SYNTHESIZED AUDIO CACHE ---
+# Speech is stored on disk as <sha256>.mp3, keyed on the exact text and the
+# voice settings that produced it, so a repeated utterance ("Executing your
+# command: open chrome", the canned "rest is on the chat screen" lines) plays
+# without a round trip to edge_tts. The directory is capped in bytes and the
+# least recently played clips are evicted first; file mtimes carry the LRU
+# order across restarts. Concurrent requests for the same clip share a single
+# synthesis.
+
+
+def AudioKey(text, voice, pitch, rate):
+    """Content address of a clip: sha256 over the text and every voice setting."""
+    material = "\x00".join([text, voice or "", pitch or "", rate or ""])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """Disk-backed LRU cache of MP3 bytes bounded by total file size."""
+
+    def __init__(self, path, max_bytes=64 << 20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._bytes = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "errors": 0}
+        self._scan()
+
+    def get_or_synthesize(self, key, synthesize):
+        """Returns the cached clip for `key` or calls synthesize() (once, however many callers wait)."""
+        with self._lock:
+            if key in self._entries:
+                audio = self._read(key)
+                if audio is not None:
+                    self.stats["hits"] += 1
+                    return audio
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                owner = False
+            else:
+                future = self._in_flight[key] = Future()
+                self.stats["misses"] += 1
+                owner = True
+
+        if not owner:
+            return future.result()
+
+        try:
+            audio = synthesize()
+        except Exception as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            if audio:
+                self._write(key, audio)
+            del self._in_flight[key]
+        future.set_result(audio)
+        return audio
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes)
+
+    # --- Internals (called with the lock held) ---
+
+    def _file(self, key):
+        return os.path.join(self.path, key + ".mp3")
+
+    def _scan(self):
+        try:
+            names = [n for n in os.listdir(self.path) if n.endswith(".mp3")]
+        except OSError:
+            return
+        found = []
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            found.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._bytes += size
+        self._evict()
+
+    def _read(self, key):
+        try:
+            with open(self._file(key), "rb") as f:
+                audio = f.read()
+            os.utime(self._file(key))  # Keeps the LRU order for the next start
+        except OSError:
+            self._bytes -= self._entries.pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return audio
+
+    def _write(self, key, audio):
+        size = len(audio)
+        if size > self.max_bytes:
+            return
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            temp = f"{self._file(key)}.{threading.get_ident()}.tmp"
+            with open(temp, "wb") as f:
+                f.write(audio)
+            os.replace(temp, self._file(key))
+        except OSError as e:
+            self.stats["errors"] += 1
+            print(f"Could not cache synthesized audio: {e}")
+            return
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)
+        self._entries[key] = size
+        self._bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.stats["evictions"] += 1
+            try:
+                os.remove(self._file(key))
+            except OSError:
+                pass
@@ -7,25 +7,17 @@ import psutil
 import keyboard
 import requests
 import re  # Added for filename sanitization
-from dotenv import dotenv_values
 from bs4 import BeautifulSoup
 from pywhatkit import search, playonyt
 from AppOpener import open as appopen
-from groq import Groq
 from rich import print
-
-# --- Load .env ---
-env_vars = dotenv_values(".env")
-GroqAPIKey = env_vars.get("GroqAPIKey")
-Username = env_vars.get("Username", "User")
+from Config import env_vars, Username
+from LLMClient import GetLLM
 
 # --- Validate Key ---
-if not GroqAPIKey:
+# Requests go through the shared, rate-limited LLM client (see LLMClient.GetLLM)
+if not env_vars.get("GroqAPIKey"):
     print("[bold red]❌ Missing GroqAPIKey in .env file![/]")
-    exit()
-
-# --- Setup Groq ---
-client = Groq(api_key=GroqAPIKey)
 
 # --- Constants ---
 classes = ["zCubwf", "hgKElc", "LTKOO sY7ric", "Z0LcW", "gsrt vk_bk FzvWSb YwPhnf", "pclqee", "tw-Data-text tw-text-small tw-ta",
@@ -42,6 +34,10 @@ os.makedirs("Data", exist_ok=True)
 
 # --- Core Functions ---
 
+def Warmup():
+    """Builds the shared LLM client ahead of the first content request."""
+    GetLLM().warm("groq")
+
 def GoogleSearch(topic):
     search(topic)
     return True
@@ -56,20 +52,16 @@ def Content(topic):
         messages = []
         messages.append({"role": "user", "content": prompt})
         
-        completion = client.chat.completions.create(
+        response = GetLLM().complete(
+            "groq",
             # SUGGESTION 4: Update the AI Model Name
             # Replaced the invalid model with a valid one from Groq.
-            model="llama-3.1-70b-versatile",
+            "llama-3.1-70b-versatile",
             messages=SystemChatBot + messages,
             max_tokens=2048,
             temperature=0.7,
-            top_p=1,
-            stream=True
+            top_p=1
         )
-        response = ""
-        for chunk in completion:
-            if chunk.choices[0].delta.content:
-                response += chunk.choices[0].delta.content
         response = response.strip().replace("</s>", "")
         messages.append({"role": "assistant", "content": response})
         return response
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from Config import env_vars
+
+# --- APPEND-ONLY CHAT LOG ---
+# The conversation memory read by ChatBot and RealtimeSearchEngine is kept per
+# session, so one user's turns never reach another user's prompts. With the
+# default (single-process) session backend each session's log lives in numbered
+# JSONL segments under Data/ChatLog/sessions/<hash>/ (the local CLI session uses
+# Data/ChatLog/ itself). A turn is appended with a single O_APPEND write, so
+# concurrent writers never lose or interleave turns, and the most recent messages
+# are kept in memory so reads never touch the disk. With SessionBackend=sqlite the
+# log is a table in the shared session database instead, so every server process
+# sees every append and trimming happens inside SQLite transactions.
+
+CHAT_LOG_DIR = env_vars.get("ChatLogDir") or os.path.join("Data", "ChatLog")
+LEGACY_CHAT_LOG_FILE = os.path.join("Data", "ChatLog.json")
+CHAT_LOG_SESSIONS = 256  # Session logs kept open per process (least recently used are closed)
+_SEGMENT_RE = re.compile(r"^segment-(\d{6})\.jsonl$")
+
+
+class ChatLogStore:
+    """Segmented JSONL message log with an in-memory tail and background compaction."""
+
+    def __init__(self, directory=CHAT_LOG_DIR, tail_size=200, segment_bytes=1 << 20,
+                 retain=1000, compact_interval=300, import_legacy=True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.retain = retain  # Messages kept by compaction
+        self._tail = deque(maxlen=tail_size)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        if import_legacy and not self._segments() and os.path.exists(LEGACY_CHAT_LOG_FILE):
+            self._import_legacy()
+            self._tail.clear()
+        for path in self._segments():
+            self._tail.extend(self._read(path))
+
+        if compact_interval:
+            self._stop = threading.Event()
+            threading.Thread(target=self._compactor, args=(compact_interval,),
+                             name="chatlog-compactor", daemon=True).start()
+
+    # --- Public API ---
+
+    def append(self, *messages):
+        """Appends messages (e.g. a user/assistant turn) in one atomic write."""
+        data = "".join(json.dumps(m, ensure_ascii=False) + "\n" for m in messages).encode("utf-8")
+        with self._lock:
+            path = self._active_segment(len(data))
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            self._tail.extend(messages)
+
+    def recent(self, n=None):
+        """Returns (a copy of) the last `n` messages, or the whole in-memory tail."""
+        with self._lock:
+            messages = list(self._tail)
+        if n is None:
+            return messages
+        return messages[-n:] if n > 0 else []
+
+    def clear(self):
+        """Deletes every segment and empties the tail."""
+        with self._lock:
+            for path in self._segments():
+                os.remove(path)
+            self._tail.clear()
+
+    def compact(self):
+        """Merges closed segments into one holding at most `retain` messages."""
+        with self._lock:
+            segments = self._segments()
+        closed = segments[:-1]  # The active segment keeps receiving appends
+        if len(closed) < 2:
+            return
+
+        active_count = sum(1 for _ in self._read(segments[-1]))
+        keep = deque(maxlen=max(self.retain - active_count, 0))
+        for path in closed:
+            keep.extend(self._read(path))
+
+        # Write the merged segment under the newest closed name, then drop the older ones
+        target = closed[-1]
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for message in keep:
+                f.write(json.dumps(message, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
+        for path in closed[:-1]:
+            os.remove(path)
+
+    # --- Internals ---
+
+    def _segments(self):
+        names = sorted(n for n in os.listdir(self.directory) if _SEGMENT_RE.match(n))
+        return [os.path.join(self.directory, n) for n in names]
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"segment-{number:06d}.jsonl")
+
+    def _active_segment(self, incoming):
+        segments = self._segments()
+        if not segments:
+            return self._segment_path(1)
+        active = segments[-1]
+        size = os.path.getsize(active)
+        if size and size + incoming > self.segment_bytes:
+            number = int(_SEGMENT_RE.match(os.path.basename(active)).group(1))
+            return self._segment_path(number + 1)
+        return active
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        messages = []
+        for line in lines:
+            try:
+                messages.append(json.loads(line))
+            except ValueError:
+                continue  # Torn line from an interrupted write
+        return messages
+
+    def _import_legacy(self):
+        try:
+            with open(LEGACY_CHAT_LOG_FILE, "r") as f:
+                messages = json.load(f)
+        except (OSError, ValueError):
+            return
+        if messages:
+            self.append(*messages)
+
+    def _compactor(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Chat log compaction failed: {e}")
+
+
+class SQLiteChatLog:
+    """One session's chat log in the shared SQLite session database (multi-process mode)."""
+
+    def __init__(self, path, session_id, tail_size=200, retain=1000):
+        self.path = path
+        self.session_id = session_id
+        self.tail_size = tail_size
+        self.retain = retain  # Messages kept per session; older ones are deleted on append
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS chat_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, data TEXT NOT NULL)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS chat_log_session ON chat_log (session_id, seq)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def append(self, *messages):
+        """Appends messages (e.g. a user/assistant turn) in one transaction."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO chat_log (session_id, data) VALUES (?, ?)",
+                [(self.session_id, json.dumps(m, ensure_ascii=False)) for m in messages],
+            )
+            conn.execute(
+                "DELETE FROM chat_log WHERE session_id = ? AND seq <= ("
+                "SELECT seq FROM chat_log WHERE session_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                (self.session_id, self.session_id, self.retain),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def recent(self, n=None):
+        """Returns the last `n` messages (at most `tail_size`), oldest first."""
+        limit = self.tail_size if n is None else min(max(n, 0), self.tail_size)
+        rows = self._conn().execute(
+            "SELECT data FROM chat_log WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+            (self.session_id, limit),
+        ).fetchall()
+        return [json.loads(data) for (data,) in reversed(rows)]
+
+    def clear(self):
+        self._conn().execute("DELETE FROM chat_log WHERE session_id = ?", (self.session_id,))
+
+    def compact(self):
+        pass  # Trimmed on every append
+
+
+def SessionLogDirectory(session_id, root=CHAT_LOG_DIR):
+    """Segment directory of a session's log (session ids come from cookies, so the name is a hash)."""
+    if session_id is None:
+        return root
+    return os.path.join(root, "sessions", hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32])
+
+
+def OpenChatLog(session_id=None):
+    """Opens the chat log of `session_id` (None = the local CLI conversation) on the configured backend."""
+    if env_vars.get("SessionBackend", "memory") == "sqlite":
+        path = env_vars.get("SessionDatabase", os.path.join("Data", "Sessions.db"))
+        return SQLiteChatLog(path, "" if session_id is None else session_id)
+    return ChatLogStore(SessionLogDirectory(session_id), compact_interval=0, import_legacy=session_id is None)
+
+
+_chat_logs = OrderedDict()  # session id -> open log, least recently used first
+_chat_log_lock = threading.Lock()
+_compactor_started = False
+COMPACT_INTERVAL = 300
+
+def GetChatLog(session_id=None):
+    """Returns the chat log of `session_id`, opening it on first use."""
+    global _compactor_started
+    with _chat_log_lock:
+        log = _chat_logs.get(session_id)
+        if log is None:
+            log = _chat_logs[session_id] = OpenChatLog(session_id)
+            while len(_chat_logs) > CHAT_LOG_SESSIONS:
+                _chat_logs.popitem(last=False)
+        else:
+            _chat_logs.move_to_end(session_id)
+        if not _compactor_started:
+            _compactor_started = True
+            threading.Thread(target=_compact_open_logs, name="chatlog-compactor", daemon=True).start()
+        return log
+
+def _compact_open_logs():
+    """One thread compacts every open session log in turn."""
+    while True:
+        threading.Event().wait(COMPACT_INTERVAL)
+        with _chat_log_lock:
+            logs = list(_chat_logs.values())
+        for log in logs:
+            try:
+                log.compact()
+            except Exception as e:
+                print(f"Chat log compaction failed: {e}")
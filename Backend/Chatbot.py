@@ -1,34 +1,27 @@
-from groq import Groq
-from json import load, dump
 import datetime
-from dotenv import dotenv_values
-import os
+from Config import env_vars, Username, Assistantname
+from LLMClient import GetLLM
+from ChatLogStore import GetChatLog
+from ContextBuilder import context_builder
+from AnswerCache import AnswerCache, IsContextFree
 
 # --- SETUP ---
 
-# Ensure 'Data' directory exists
-if not os.path.exists("Data"):
-    os.makedirs("Data")
-
-# Load environment variables
-if not os.path.exists(".env"):
-    print("Warning: .env file not found. Default values will be used.")
-env_vars = dotenv_values(".env")
-
-# Load credentials and names
-Username = env_vars.get("Username", "User")
-Assistantname = env_vars.get("Assistantname", "SARA")
-GroqAPIKey = env_vars.get("GroqAPIKey")
-
-if not GroqAPIKey:
+# Credentials come from Config; requests go through the shared, rate-limited LLM client
+if not env_vars.get("GroqAPIKey"):
     print("Error: GroqAPIKey not found in .env file. Please add it.")
-    exit()
 
-# Initialize Groq client
-client = Groq(api_key=GroqAPIKey)
+# Model used for answers; ContextBuilder fits history into its prompt-token budget
+MODEL = "llama-3.3-70b-versatile"
 
-# Chat log file path
-CHAT_LOG_FILE = "Data/ChatLog.json"
+# Opt-in cache of answers to context-free questions (AnswerCache=true in .env)
+answer_cache = None
+if env_vars.get("AnswerCache", "").lower() == "true":
+    answer_cache = AnswerCache(
+        maxsize=int(env_vars.get("AnswerCacheSize", 512)),
+        ttl=float(env_vars.get("AnswerCacheTTL", 86400)),
+        similarity=float(env_vars.get("AnswerCacheSimilarity", 0)),
+    )
 
 # --- SYSTEM MESSAGES ---
 
@@ -44,6 +37,11 @@ SystemChatBot = [
 
 # --- HELPER FUNCTIONS ---
 
+def Warmup():
+    """Builds the shared LLM client and loads the chat log ahead of the first query."""
+    GetLLM().warm("groq")
+    GetChatLog()
+
 def RealtimeInformation():
     """Returns current real-time info as string."""
     now = datetime.datetime.now()
@@ -55,48 +53,50 @@ def AnswerModifier(Answer):
 
 # --- MAIN CHAT FUNCTION ---
 
-def ChatBot(Query):
+def GenerateAnswer(Query, on_token=None, session_id=None, history=None):
+    """Streams a fresh completion for `Query` in `session_id`'s conversation and returns the raw answer text.
+    `history` replaces the session's chat log (answers shared across sessions pass [])."""
+    if history is None:
+        history = GetChatLog(session_id).recent()
+    # Compose full prompt within the model's token budget; older turns are summarized
+    full_prompt = context_builder.build(
+        MODEL, SystemChatBot, Query, history, realtime=RealtimeInformation(), session_id=session_id,
+    )
+
+    # Call Groq API with a **supported model** (retried and rate-limited by LLMClient)
+    completion = GetLLM().stream(
+        "groq",
+        MODEL,  # ✅ Updated to current model
+        messages=full_prompt,
+        max_tokens=1024,
+        temperature=0.7,
+        top_p=1,
+        stop=None
+    )
+
+    Answer = ""
+    for delta in completion:
+        Answer += delta
+        if on_token:
+            on_token(delta)
+
+    return Answer.replace("</s>", "")
+
+def ChatBot(Query, on_token=None, session_id=None):
+    """Answers a general query in `session_id`'s conversation (None = the local CLI one).
+    If given, `on_token(text)` is called with each streamed delta."""
     try:
-        # Load existing chat log or initialize
-        try:
-            with open(CHAT_LOG_FILE, "r") as f:
-                messages = load(f)
-        except (FileNotFoundError, ValueError):
-            messages = []
-
-        # Add user's message
-        messages.append({"role": "user", "content": Query})
-
-        # Compose full prompt
-        full_prompt = SystemChatBot + [{"role": "system", "content": RealtimeInformation()}] + messages
-
-        # Call Groq API with a **supported model**
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",  # ✅ Updated to current model
-            messages=full_prompt,
-            max_tokens=1024,
-            temperature=0.7,
-            top_p=1,
-            stream=True,
-            stop=None
-        )
-
-        Answer = ""
-        for chunk in completion:
-            if chunk.choices[0].delta.content:
-                Answer += chunk.choices[0].delta.content
-
-        Answer = Answer.replace("</s>", "")
-        messages.append({"role": "assistant", "content": Answer})
-
-        # Trim history to avoid large prompts
-        MAX_HISTORY = 20
-        if len(messages) > MAX_HISTORY * 2:
-            messages = messages[-MAX_HISTORY * 2:]
-
-        # Save updated log
-        with open(CHAT_LOG_FILE, "w") as f:
-            dump(messages, f, indent=4)
+        if answer_cache is not None and IsContextFree(Query):
+            # Repeats (and concurrent duplicates) of context-free questions share one completion; it is
+            # generated without this session's history, since other sessions will be served the answer
+            Answer, source = answer_cache.get_or_compute(Query, lambda: GenerateAnswer(Query, on_token, history=[]))
+            if source != "computed" and on_token:
+                on_token(Answer)
+        else:
+            Answer = GenerateAnswer(Query, on_token, session_id)
+
+        # Append the turn to the log in one atomic write
+        GetChatLog(session_id).append({"role": "user", "content": Query}, {"role": "assistant", "content": Answer})
 
         return AnswerModifier(Answer)
     
@@ -104,9 +104,7 @@ def ChatBot(Query):
         print("\n--- An Error Occurred ---")
         print(f"Error details: {e}")
         print("-------------------------\n")
-        with open(CHAT_LOG_FILE, "w") as f:
-            dump([], f)
-        return "Sorry, I encountered an error. The chat history has been reset. Please try your query again."
+        return "Sorry, I encountered an error. Please try your query again."
 
 # --- RUN CHAT LOOP ---
 
@@ -0,0 +1,47 @@
+import os
+import threading
+from dotenv import dotenv_values
+
+# --- SHARED CONFIGURATION ---
+# The .env file is read once here; every module imports `env_vars` from this module
+# instead of parsing the file itself.
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+ENV_PATH = os.path.join(ROOT_DIR, ".env")
+
+if not os.path.exists(ENV_PATH):
+    print("Warning: .env file not found. Default values will be used.")
+env_vars = dotenv_values(ENV_PATH)
+
+Username = env_vars.get("Username", "User")
+Assistantname = env_vars.get("Assistantname", "SARA")
+
+# --- SHARED API CLIENTS ---
+# Built on first use so that importing a module never pays for SDK imports or
+# client construction; all modules share one client per provider.
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def GetGroqClient():
+    """Returns the shared Groq client, creating it on first use."""
+    with _clients_lock:
+        if "groq" not in _clients:
+            api_key = env_vars.get("GroqAPIKey")
+            if not api_key:
+                raise RuntimeError("GroqAPIKey not found in .env file. Please add it.")
+            from groq import Groq
+            # Retries are handled (once, with rate-limit awareness) by LLMClient
+            _clients["groq"] = Groq(api_key=api_key, max_retries=0)
+        return _clients["groq"]
+
+def GetCohereClient():
+    """Returns the shared Cohere client, creating it on first use."""
+    with _clients_lock:
+        if "cohere" not in _clients:
+            api_key = env_vars.get("CohereAPIKey")
+            if not api_key:
+                raise RuntimeError("CohereAPIKey not found in .env file. Please add it.")
+            import cohere
+            _clients["cohere"] = cohere.Client(api_key=api_key)
+        return _clients["cohere"]
@@ -0,0 +1,213 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+# --- TOKEN-BUDGET PROMPT ASSEMBLY ---
+# ChatBot and RealtimeSearchEngine build their prompts here. Every part is measured
+# with a cheap local token estimate and fitted into the model's prompt budget:
+# system prompt and query always go in, then search results and realtime info,
+# then as many recent turns as fit. Older turns are folded into a rolling summary
+# that is refreshed in the background and reused across calls; every session has
+# its own summary, just as it has its own chat log.
+
+# Prompt-token budgets per model (completion tokens are reserved separately)
+PROMPT_BUDGETS = {
+    "llama-3.3-70b-versatile": 6000,
+    "llama-3.1-8b-instant": 4000,
+}
+DEFAULT_PROMPT_BUDGET = 4000
+SUMMARY_MODEL = "llama-3.1-8b-instant"
+SUMMARY_MAX_TOKENS = 300
+SUMMARY_INPUT_TOKENS = 3000  # Most turns sent to the summary model in one refresh
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and framing tokens added per chat message
+SEARCH_SHARE = 0.6  # Fraction of the budget left after the must-have parts that search results may use
+SUMMARY_SESSIONS = 256  # Session summaries kept in memory (least recently used are dropped)
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def EstimateTokens(text):
+    """Approximates the BPE token count of `text` (words, long words split every ~4 chars, punctuation)."""
+    if not text:
+        return 0
+    return sum(1 + (len(t) - 1) // 4 for t in _TOKEN_RE.findall(text))
+
+
+def MessageTokens(message):
+    return EstimateTokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+
+
+def TruncateToTokens(text, max_tokens):
+    """Cuts `text` so that its estimate fits `max_tokens`, ending on a line boundary when possible."""
+    if EstimateTokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    used = 0
+    for match in _TOKEN_RE.finditer(text):
+        used += 1 + (len(match.group()) - 1) // 4
+        if used > max_tokens:
+            cut = text[:match.start()]
+            line_end = cut.rfind("\n")
+            return (cut[:line_end] if line_end > len(cut) // 2 else cut).rstrip() + "\n[truncated]"
+    return text
+
+
+def CapMessages(messages, max_tokens):
+    """The newest messages that fit `max_tokens` (a lone oversized message is truncated to fit)."""
+    kept, used = [], 0
+    for message in reversed(messages):
+        cost = MessageTokens(message)
+        if used + cost > max_tokens:
+            if not kept:
+                content = TruncateToTokens(message.get("content", ""), max_tokens - MESSAGE_OVERHEAD_TOKENS)
+                kept.append(dict(message, content=content))
+            break
+        kept.append(message)
+        used += cost
+    kept.reverse()
+    return kept
+
+
+def _digest(message):
+    return hashlib.sha1(f"{message.get('role')}:{message.get('content')}".encode("utf-8")).hexdigest()
+
+
+def GroqSummarizer(previous_summary, messages):
+    """Default summarizer: condenses the previous summary plus older turns with a small Groq model."""
+    from LLMClient import GetLLM
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = (
+        "Update the running summary of a conversation between a user and an assistant. "
+        "Keep names, facts, preferences and open questions; be brief.\n\n"
+        f"Current summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"
+    )
+    return GetLLM().complete(
+        "groq",
+        SUMMARY_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=SUMMARY_MAX_TOKENS,
+        temperature=0.2,
+    ).strip()
+
+
+class RollingSummary:
+    """Summary of the turns that no longer fit the prompt, refreshed off the request path.
+
+    ChatBot and RealtimeSearchEngine fold different amounts of history (search results
+    take part of the budget), so a summary is kept per fold point, keyed by the newest
+    message it covers. A new fold point extends the newest cached summary it contains
+    with only the turns after it, and at most SUMMARY_INPUT_TOKENS of them are sent."""
+
+    def __init__(self, summarizer=GroqSummarizer, max_points=4):
+        self.summarizer = summarizer
+        self.max_points = max_points
+        self._points = OrderedDict()  # digest of the newest folded message -> summary text
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def get(self, folded):
+        """Returns the best cached summary of `folded` and schedules a refresh if it has newer turns."""
+        if not folded:
+            return ""
+        digests = [_digest(m) for m in folded]
+        with self._lock:
+            if digests[-1] in self._points:
+                self._points.move_to_end(digests[-1])
+                return self._points[digests[-1]]
+            start, previous = 0, ""
+            for i in range(len(digests) - 2, -1, -1):
+                if digests[i] in self._points:
+                    start, previous = i + 1, self._points[digests[i]]
+                    break
+            if self._refreshing:
+                return previous
+            self._refreshing = True
+        pending = CapMessages(folded[start:], SUMMARY_INPUT_TOKENS)
+        threading.Thread(target=self._refresh, args=(previous, pending, digests[-1]), daemon=True).start()
+        return previous
+
+    def _refresh(self, previous, pending, key):
+        try:
+            text = self.summarizer(previous, pending)
+            with self._lock:
+                self._points[key] = TruncateToTokens(text, SUMMARY_MAX_TOKENS)
+                while len(self._points) > self.max_points:
+                    self._points.popitem(last=False)
+        except Exception as e:
+            print(f"Conversation summary refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+
+class ContextBuilder:
+    """Fits system prompt, context blocks, history and query into a per-model token budget."""
+
+    def __init__(self, budgets=None, default_budget=DEFAULT_PROMPT_BUDGET, summary_factory=RollingSummary,
+                 max_sessions=SUMMARY_SESSIONS):
+        self.budgets = dict(PROMPT_BUDGETS if budgets is None else budgets)
+        self.default_budget = default_budget
+        self.summary_factory = summary_factory
+        self.max_sessions = max_sessions
+        self._summaries = OrderedDict()  # session id -> RollingSummary, least recently used first
+        self._lock = threading.Lock()
+
+    def budget(self, model):
+        return self.budgets.get(model, self.default_budget)
+
+    def summary(self, session_id=None):
+        """Returns the rolling summary of `session_id`'s conversation."""
+        with self._lock:
+            summary = self._summaries.get(session_id)
+            if summary is None:
+                summary = self._summaries[session_id] = self.summary_factory()
+                while len(self._summaries) > self.max_sessions:
+                    self._summaries.popitem(last=False)
+            else:
+                self._summaries.move_to_end(session_id)
+            return summary
+
+    def build(self, model, system, query, history, search=None, realtime=None, session_id=None):
+        """Returns the chat messages for one completion call; `history` is `session_id`'s chat log."""
+        remaining = self.budget(model)
+        user = {"role": "user", "content": query}
+        remaining -= sum(MessageTokens(m) for m in system) + MessageTokens(user)
+
+        context = []
+        if realtime:
+            remaining -= EstimateTokens(realtime) + MESSAGE_OVERHEAD_TOKENS
+        if search:
+            search = TruncateToTokens(search, max(int(remaining * SEARCH_SHARE) - MESSAGE_OVERHEAD_TOKENS, 0))
+            remaining -= EstimateTokens(search) + MESSAGE_OVERHEAD_TOKENS
+            context.append({"role": "system", "content": search})
+        if realtime:
+            context.append({"role": "system", "content": realtime})
+
+        # Newest turns first, leaving room for the summary of whatever is folded away
+        summary_reserve = SUMMARY_MAX_TOKENS + MESSAGE_OVERHEAD_TOKENS
+        kept = []
+        for i in range(len(history) - 1, -1, -1):
+            cost = MessageTokens(history[i])
+            reserve = summary_reserve if i > 0 else 0
+            if cost + reserve > remaining:
+                break
+            kept.append(history[i])
+            remaining -= cost
+        kept.reverse()
+        folded = history[:len(history) - len(kept)]
+        # Don't open the kept history with a dangling assistant reply
+        if kept and kept[0].get("role") == "assistant":
+            folded = folded + kept[:1]
+            kept = kept[1:]
+
+        summary = self.summary(session_id).get(folded) if folded else ""
+        if summary:
+            context.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+
+        return list(system) + context + kept + [user]
+
+
+# Shared by ChatBot and RealtimeSearchEngine (they read the same per-session chat logs)
+context_builder = ContextBuilder()
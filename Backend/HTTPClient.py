@@ -0,0 +1,131 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- SHARED HTTP CLIENT ---
+# Image generation (and anything else calling an HTTP inference API) goes through
+# one HTTPClient. It keeps a pooled keep-alive requests.Session, so connections
+# and TLS sessions are reused across images and jobs, and caps the requests in
+# flight per endpoint (scheme + host). 429/5xx responses and connection errors
+# are retried with jittered backoff that honours Retry-After and Hugging Face's
+# {"estimated_time": ...} "model is loading" replies. post() is a coroutine: the
+# blocking call runs on a worker thread, and a per-request timeout plus an overall
+# deadline bound it; cancelling the awaiting task stops further retries.
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class HTTPRequestError(Exception):
+    """Raised when a request fails for good (non-retryable status, retries or deadline exhausted)."""
+
+    def __init__(self, message, status=None, body=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+def RetryDelay(response):
+    """Seconds the server asked us to wait: Retry-After (seconds or HTTP date), else a JSON estimated_time."""
+    value = response.headers.get("Retry-After")
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    try:
+        estimated = json.loads(response.content or b"{}").get("estimated_time")
+    except (ValueError, AttributeError):
+        return None
+    return max(float(estimated), 0.0) if isinstance(estimated, (int, float)) else None
+
+
+def Endpoint(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class HTTPClient:
+    """Keep-alive HTTP session with a per-endpoint concurrency cap and retrying async post()."""
+
+    def __init__(self, max_per_endpoint=4, timeout=60.0, deadline=300.0, max_retries=4,
+                 backoff_base=1.0, backoff_cap=30.0):
+        self.max_per_endpoint = max_per_endpoint
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max_per_endpoint)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._limits = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "errors": 0, "waited_seconds": 0.0}
+
+    def _limit(self, url):
+        endpoint = Endpoint(url)
+        with self._lock:
+            if endpoint not in self._limits:
+                self._limits[endpoint] = threading.BoundedSemaphore(self.max_per_endpoint)
+            return self._limits[endpoint]
+
+    def _record(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self.stats[name] += value
+
+    def _send(self, url, timeout, kwargs):
+        # The semaphore is a thread primitive, so the cap holds across event loops and worker threads
+        with self._limit(url):
+            self._record(requests=1)
+            return self.session.post(url, timeout=timeout, **kwargs)
+
+    async def post(self, url, timeout=None, deadline=None, **kwargs):
+        """POSTs with retries and returns the successful requests.Response; raises HTTPRequestError."""
+        timeout = self.timeout if timeout is None else timeout
+        give_up = time.monotonic() + (self.deadline if deadline is None else deadline)
+        error = HTTPRequestError(f"POST {url} exceeded its deadline")
+        for attempt in range(self.max_retries + 1):
+            remaining = give_up - time.monotonic()
+            if remaining <= 0:
+                break
+            delay = None
+            try:
+                response = await asyncio.wait_for(
+                    asyncio.to_thread(self._send, url, min(timeout, remaining), kwargs), remaining)
+            except (requests.ConnectionError, requests.Timeout, asyncio.TimeoutError) as e:
+                error = HTTPRequestError(f"POST {url} failed: {e}")
+            else:
+                if response.ok:
+                    return response
+                error = HTTPRequestError(f"POST {url} returned {response.status_code}: {response.text[:200]}",
+                                         status=response.status_code, body=response.content)
+                if response.status_code not in RETRYABLE_STATUS:
+                    self._record(errors=1)
+                    raise error
+                delay = RetryDelay(response)
+            if attempt == self.max_retries:
+                break
+            if delay is None:
+                delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+            delay = min(delay + random.uniform(0, 0.25), max(give_up - time.monotonic(), 0.0))
+            self._record(retries=1, waited_seconds=delay)
+            print(f"[WARN] {error}; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        self._record(errors=1)
+        raise error
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
@@ -1,44 +1,58 @@
 import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
 from random import randint
-from PIL import Image
-import requests
-from dotenv import get_key
 import os
+from Config import env_vars
+from HTTPClient import HTTPClient, HTTPRequestError
+from ImageStore import ImageStore
+from Telemetry import Span, RecordError
 from time import sleep
 
 # --- SETUP AND CONFIGURATION ---
 
-# Ensure the main data directory exists
-os.makedirs("Data", exist_ok=True)
+# Job queue database shared by the web app and the standalone service
+IMAGE_JOBS_DB = env_vars.get("ImageJobsDatabase") or os.path.join("Data", "ImageJobs.db")
 
-# Define the path for the communication file
-IMAGE_GEN_FILE = os.path.join("Frontend", "Files", "ImageGeneration.data")
+# A job still 'running' this long after it was claimed belongs to a crashed or restarted
+# worker and is queued again, at most IMAGE_JOB_ATTEMPTS times in total
+IMAGE_JOB_LEASE_SECONDS = float(env_vars.get("ImageJobLease", 900))
+IMAGE_JOB_ATTEMPTS = 3
 
 # IMPROVEMENT 1: Robust Configuration and Startup
-# Load API key and configure headers within a try-except block to handle errors early.
-try:
-    HUGGINGFACE_API_KEY = get_key('.env', 'HuggingFaceAPIKey')
-    if not HUGGINGFACE_API_KEY:
-        raise ValueError("HuggingFaceAPIKey not found or is empty in .env file.")
-    
-    API_URL = "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-xl-base-1.0"
-    HEADERS = {"Authorization": f"Bearer {HUGGINGFACE_API_KEY}"}
-except (ValueError, FileNotFoundError) as e:
-    print(f"Error: Configuration failed - {e}")
-    exit() # Exit if the API key isn't configured properly
+# The key is checked here but only enforced by the standalone service, so that
+# importing this module from app.py never terminates the server.
+HUGGINGFACE_API_KEY = env_vars.get('HuggingFaceAPIKey')
+# ImageAPIURL points image generation at another endpoint, e.g. a local fake server in tests
+API_URL = env_vars.get("ImageAPIURL") or "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-xl-base-1.0"
+HEADERS = {"Authorization": f"Bearer {HUGGINGFACE_API_KEY}"}
+
+# One keep-alive session for every image request; 503 "model loading" replies are retried
+http_client = HTTPClient(
+    max_per_endpoint=int(env_vars.get("ImageMaxConcurrency", 4)),
+    timeout=float(env_vars.get("ImageRequestTimeout", 60)),
+    deadline=float(env_vars.get("ImageRequestDeadline", 300)),
+    max_retries=int(env_vars.get("ImageMaxRetries", 4)),
+)
+
+# Generated images are stored by content hash; exact repeats of a prompt are served from the store
+IMAGES_PER_PROMPT = 4
+image_store = ImageStore(
+    root=env_vars.get("ImageStoreDir") or os.path.join("Data", "Images"),
+    max_bytes=int(float(env_vars.get("ImageStoreMB", 512)) * (1 << 20)),
+)
 
 # --- CORE FUNCTIONS ---
 
-def open_images(prompt: str):
-    """Opens and displays the four generated images for a given prompt."""
-    folder_path = "Data"
-    # Sanitize prompt for use in filenames
-    safe_prompt = prompt.replace(" ", "_")
-    files = [f"{safe_prompt}{i}.jpg" for i in range(1, 5)]
+def open_images(files):
+    """Opens and displays the generated images."""
+    from PIL import Image  # Only needed for local display; keeps app startup light
 
     print("Displaying generated images...")
-    for jpg_file in files:
-        image_path = os.path.join(folder_path, jpg_file)
+    for image_path in files:
         try:
             img = Image.open(image_path)
             img.show()
@@ -49,12 +63,14 @@ def open_images(prompt: str):
 # IMPROVEMENT 2: Enhanced API Error Handling
 async def query(payload: dict):
     """Sends a single asynchronous request to the Hugging Face API with better error logging."""
+    if not HUGGINGFACE_API_KEY:
+        print("API Error: HuggingFaceAPIKey not found or is empty in .env file.")
+        return None
     try:
-        response = await asyncio.to_thread(requests.post, API_URL, headers=HEADERS, json=payload)
-        response.raise_for_status() # Raises an exception for bad status codes (4xx or 5xx)
+        response = await http_client.post(API_URL, headers=HEADERS, json=payload)
         return response.content
-    except requests.exceptions.HTTPError as e:
-        print(f"API Error: {e.response.status_code} - {e.response.text}")
+    except HTTPRequestError as e:
+        print(f"API Error: {e}")
         return None
     except Exception as e:
         print(f"An unexpected error occurred during API query: {e}")
@@ -62,12 +78,13 @@ async def query(payload: dict):
 
 async def generate_images_async(prompt: str):
     """Creates and runs four concurrent image generation tasks."""
-    print("Sending 4 concurrent requests to the API...")
+    print(f"Sending {IMAGES_PER_PROMPT} concurrent requests to the API...")
+    seeds = [randint(0, 1000000) for _ in range(IMAGES_PER_PROMPT)]
     tasks = []
-    for i in range(4):
+    for seed in seeds:
         # Create a unique, enhanced payload for each image
         payload = {
-            "inputs": f"{prompt}, 4k, high-resolution, photorealistic, seed={randint(0, 1000000)}",
+            "inputs": f"{prompt}, 4k, high-resolution, photorealistic, seed={seed}",
         }
         task = asyncio.create_task(query(payload))
         tasks.append(task)
@@ -75,63 +92,190 @@ async def generate_images_async(prompt: str):
     # Wait for all API calls to complete
     image_bytes_list = await asyncio.gather(*tasks)
 
-    # Save the successfully generated images to files
-    saved_count = 0
-    safe_prompt = prompt.replace(' ', '_')
-    for i, image_bytes in enumerate(image_bytes_list):
+    # Save the successfully generated images to the store
+    saved = []
+    for i, (seed, image_bytes) in enumerate(zip(seeds, image_bytes_list)):
         if image_bytes:
-            file_path = os.path.join("Data", f"{safe_prompt}{i + 1}.jpg")
             try:
-                with open(file_path, "wb") as f:
-                    f.write(image_bytes)
-                saved_count += 1
-            except IOError as e:
+                saved.append(image_store.put(prompt, seed, image_bytes))
+            except (IOError, sqlite3.Error) as e:
                 print(f"Error saving image {i+1}: {e}")
-    print(f"Successfully saved {saved_count} of 4 images.")
+    print(f"Successfully saved {len(saved)} of {IMAGES_PER_PROMPT} images.")
+    return saved
+
+def run_image_generation(prompt: str, show: bool = True):
+    """Returns the images of an earlier identical prompt, or generates, stores and thumbnails new ones;
+    then (optionally) opens them. Returns saved paths."""
+    saved = image_store.lookup(prompt, IMAGES_PER_PROMPT)
+    if saved:
+        print(f"Reusing {len(saved)} stored images for '{prompt}'.")
+    else:
+        saved = asyncio.run(generate_images_async(prompt))
+    image_store.make_thumbnails(saved)
+    image_store.evict(keep=saved)
+    if show:
+        open_images(saved)
+    return saved
+
+# --- JOB QUEUE ---
 
-def run_image_generation(prompt: str):
-    """Synchronous wrapper to generate and then open images."""
-    asyncio.run(generate_images_async(prompt))
-    open_images(prompt)
+class ImageJobQueue:
+    """FIFO of image generation jobs stored in SQLite, so the web app and the
+    standalone service can both submit to and consume from the same queue."""
+
+    def __init__(self, path=IMAGE_JOBS_DB, poll_interval=1.0, lease_seconds=IMAGE_JOB_LEASE_SECONDS,
+                 max_attempts=IMAGE_JOB_ATTEMPTS):
+        self.path = path
+        self.poll_interval = poll_interval  # Fallback for jobs submitted by another process
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE NOT NULL, prompt TEXT NOT NULL,
+            status TEXT NOT NULL, files TEXT, error TEXT,
+            created REAL NOT NULL, started REAL, finished REAL, attempts INTEGER NOT NULL DEFAULT 0)""")
+        if "attempts" not in [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]:
+            conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, prompt: str) -> str:
+        """Queues a prompt and returns its job id."""
+        job_id = uuid.uuid4().hex
+        self._conn().execute(
+            "INSERT INTO jobs (id, prompt, status, created) VALUES (?, ?, 'pending', ?)",
+            (job_id, prompt, time.time()),
+        )
+        with self._cond:
+            self._cond.notify()
+        return job_id
+
+    def get(self, job_id: str):
+        """Returns the job as a dict (with its queue position while pending), or None."""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT seq, id, prompt, status, files, error, created, started, finished FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        seq, job_id, prompt, status, files, error, created, started, finished = row
+        job = {
+            "id": job_id, "prompt": prompt, "status": status, "files": json.loads(files or "[]"),
+            "error": error, "created": created, "started": started, "finished": finished,
+        }
+        if status == "pending":
+            job["position"] = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'pending' AND seq <= ?", (seq,)
+            ).fetchone()[0]
+        return job
+
+    def claim(self, timeout=None):
+        """Atomically takes the oldest pending job, waiting up to `timeout` seconds. Returns (id, prompt) or None."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        conn = self._conn()
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._recover_stale(conn)
+                row = conn.execute(
+                    "SELECT id, prompt FROM jobs WHERE status = 'pending' ORDER BY seq LIMIT 1"
+                ).fetchone()
+                if row:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', started = ?, attempts = attempts + 1 WHERE id = ?",
+                        (time.time(), row[0])
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if row:
+                return row
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            with self._cond:
+                self._cond.wait(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+
+    def _recover_stale(self, conn):
+        """Re-queues jobs whose lease expired (inside the caller's write transaction); jobs that
+        already used every attempt are failed instead."""
+        expired = time.time() - self.lease_seconds
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Worker stopped while running the job.', finished = ? "
+            "WHERE status = 'running' AND started < ? AND attempts >= ?",
+            (time.time(), expired, self.max_attempts),
+        )
+        requeued = conn.execute(
+            "UPDATE jobs SET status = 'pending', started = NULL WHERE status = 'running' AND started < ?",
+            (expired,),
+        ).rowcount
+        if requeued:
+            print(f"Re-queued {requeued} image job(s) left running by a stopped worker.")
+
+    def finish(self, job_id: str, files):
+        self._conn().execute(
+            "UPDATE jobs SET status = 'done', files = ?, finished = ? WHERE id = ?",
+            (json.dumps(files), time.time(), job_id),
+        )
+
+    def fail(self, job_id: str, error: str):
+        self._conn().execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+            (error, time.time(), job_id),
+        )
+
+    def pending(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM jobs WHERE status = 'pending'").fetchone()[0]
+
+def image_worker(job_queue: ImageJobQueue, show: bool = True):
+    """Consumes jobs from the queue forever."""
+    while True:
+        job_id, prompt = job_queue.claim()
+        print(f"\nReceived request to generate images for prompt: '{prompt}'")
+        try:
+            with Span("image.job", job=job_id):
+                files = run_image_generation(prompt=prompt, show=show)
+            if files:
+                job_queue.finish(job_id, files)
+            else:
+                RecordError("image.job")
+                job_queue.fail(job_id, "No images were generated.")
+        except Exception as e:
+            print(f"An unexpected error occurred in image job {job_id}: {e}")
+            job_queue.fail(job_id, str(e))
+
+def StartImageWorkers(job_queue: ImageJobQueue, workers: int = 2, show: bool = True):
+    """Starts `workers` daemon threads consuming the image job queue."""
+    for i in range(workers):
+        threading.Thread(target=image_worker, args=(job_queue, show), name=f"image-{i}", daemon=True).start()
 
 # --- MAIN SERVICE LOOP ---
 
 # IMPROVEMENT 3 & 4: Refined Main Loop and Clearer Feedback
-def main():
-    """Monitors for image generation requests and processes them."""
+def main(workers: int = 2):
+    """Runs image workers against the shared job queue (standalone service mode)."""
+    if not HUGGINGFACE_API_KEY:
+        print("Error: Configuration failed - HuggingFaceAPIKey not found or is empty in .env file.")
+        exit()
+
     print("--- Image Generation Service Started ---")
-    print("Waiting for a request from the frontend...")
-    
+    print("Waiting for jobs from the frontend...")
+    job_queue = ImageJobQueue()
+    StartImageWorkers(job_queue, workers=workers)
     while True:
-        try:
-            with open(IMAGE_GEN_FILE, "r") as f:
-                data = f.read().strip()
-
-            # Split data only if it's not empty
-            if data:
-                prompt, status = data.split(",", 1)
-
-                if status == "True":
-                    print(f"\nReceived request to generate images for prompt: '{prompt}'")
-                    run_image_generation(prompt=prompt)
-
-                    # Reset the status in the file after generating images
-                    with open(IMAGE_GEN_FILE, "w") as f:
-                        f.write("False,False")
-                    
-                    print("\nTask complete. Waiting for new request...")
-            
-            sleep(2) # Wait 2 seconds before polling again
-
-        except FileNotFoundError:
-            print("Communication file not found. Waiting for frontend to create it...")
-            sleep(5)
-        except ValueError:
-            # Handles cases where the file is empty or being written to.
-            sleep(1)
-        except Exception as e:
-            print(f"An unexpected error occurred in the main loop: {e}")
-            sleep(5)
+        sleep(60)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,154 @@
+import hashlib
+import importlib.util
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# --- CONTENT-ADDRESSED IMAGE STORE ---
+# Generated images are saved as <sha256>.jpg, so identical images are stored
+# once and different prompts never overwrite each other. A SQLite index (shared
+# by the web app and the standalone image service) maps each prompt and seed to
+# its image and records when every image was last used; once the store grows
+# past its byte cap the least recently used images are deleted. Each image gets
+# a small WebP thumbnail for the chat UI, made with Pillow on a small thread pool
+# (Pillow releases the GIL while decoding, resizing and encoding).
+
+THUMBNAIL_SIZE = (256, 256)
+THUMBNAIL_DIR = "thumbs"
+
+
+def NormalizePrompt(prompt):
+    """Folds case and whitespace, so only exact repeats of a prompt share cached images."""
+    return " ".join(prompt.lower().split())
+
+
+def ThumbnailPath(image_path):
+    """Where the WebP thumbnail of a stored image lives (it may not exist)."""
+    folder, name = os.path.split(image_path)
+    return os.path.join(folder, THUMBNAIL_DIR, os.path.splitext(name)[0] + ".webp")
+
+
+def MakeThumbnail(image_path, thumbnail_path, size=THUMBNAIL_SIZE):
+    """Writes a downscaled WebP copy of an image (runs on a thumbnail thread)."""
+    from PIL import Image  # Only needed for thumbnails; keeps app startup light
+    with Image.open(image_path) as img:
+        img.thumbnail(size)
+        temp = f"{thumbnail_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        img.save(temp, "WEBP", quality=80)
+    os.replace(temp, thumbnail_path)
+    return thumbnail_path
+
+
+class ImageStore:
+    """Images on disk by content hash, with a prompt+seed index, LRU eviction and thumbnails."""
+
+    def __init__(self, root=os.path.join("Data", "Images"), max_bytes=512 << 20, thumbnail_workers=2):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.thumbnail_workers = thumbnail_workers
+        self._thumbnailer = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, THUMBNAIL_DIR), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS images (
+            hash TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS prompts (
+            prompt TEXT NOT NULL, seed INTEGER NOT NULL, hash TEXT NOT NULL, created REAL NOT NULL,
+            PRIMARY KEY (prompt, seed))""")
+        conn.execute("CREATE INDEX IF NOT EXISTS prompts_hash ON prompts (hash)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.root, "index.db"), timeout=10, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def path(self, image_hash):
+        return os.path.join(self.root, image_hash + ".jpg")
+
+    def lookup(self, prompt, count):
+        """Paths of `count` images generated earlier for this exact prompt (most recent first), or None."""
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT hash FROM prompts WHERE prompt = ? ORDER BY created DESC", (NormalizePrompt(prompt),)
+        ).fetchall()
+        hashes = [h for (h,) in rows if os.path.exists(self.path(h))][:count]
+        if len(hashes) < count:
+            return None
+        now = time.time()
+        conn.executemany("UPDATE images SET last_used = ? WHERE hash = ?", [(now, h) for h in hashes])
+        return [self.path(h) for h in hashes]
+
+    def put(self, prompt, seed, data):
+        """Stores image bytes for prompt+seed and returns their path."""
+        image_hash = hashlib.sha256(data).hexdigest()
+        path = self.path(image_hash)
+        if not os.path.exists(path):
+            temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp, "wb") as f:
+                f.write(data)
+            os.replace(temp, path)
+        now = time.time()
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO images (hash, size, last_used) VALUES (?, ?, ?)",
+                     (image_hash, len(data), now))
+        conn.execute("INSERT OR REPLACE INTO prompts (prompt, seed, hash, created) VALUES (?, ?, ?, ?)",
+                     (NormalizePrompt(prompt), seed, image_hash, now))
+        return path
+
+    def make_thumbnails(self, paths):
+        """Creates missing thumbnails on the thumbnail threads and waits for them; failures are skipped."""
+        if importlib.util.find_spec("PIL") is None:
+            return 0  # Without Pillow the UI falls back to the full images
+        pending = []
+        for path in paths:
+            thumbnail = ThumbnailPath(path)
+            if not os.path.exists(thumbnail):
+                pending.append(self._pool().submit(MakeThumbnail, path, thumbnail))
+        made = 0
+        for future in pending:
+            try:
+                future.result()
+                made += 1
+            except Exception as e:
+                print(f"Could not create thumbnail: {e}")
+        return made
+
+    def evict(self, keep=()):
+        """Deletes least recently used images (never those in `keep`) until the store fits its cap."""
+        keep = {os.path.basename(p)[:-4] for p in keep}
+        conn = self._conn()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+        evicted = 0
+        for image_hash, size in conn.execute("SELECT hash, size FROM images ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            if image_hash in keep:
+                continue
+            for path in (self.path(image_hash), ThumbnailPath(self.path(image_hash))):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            conn.execute("DELETE FROM images WHERE hash = ?", (image_hash,))
+            conn.execute("DELETE FROM prompts WHERE hash = ?", (image_hash,))
+            total -= size
+            evicted += 1
+        return evicted
+
+    def snapshot(self):
+        count, total = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images").fetchone()
+        return {"images": count, "bytes": total, "max_bytes": self.max_bytes}
+
+    def _pool(self):
+        with self._lock:
+            if self._thumbnailer is None:
+                self._thumbnailer = ThreadPoolExecutor(max_workers=self.thumbnail_workers,
+                                                       thread_name_prefix="thumbnail")
+            return self._thumbnailer
@@ -0,0 +1,305 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from Config import env_vars, GetGroqClient, GetCohereClient
+from ContextBuilder import EstimateTokens
+from Telemetry import LLM_TTFT_SECONDS, LLM_SECONDS, RecordSpan
+
+# --- SHARED LLM CLIENT LAYER ---
+# Every Groq and Cohere call goes through one LLMClient. It reuses one pooled
+# SDK client per provider and throttles requests and tokens per provider/model
+# with token buckets. Calls that fail with 429, 5xx or a connection error are
+# retried with jittered backoff that honours Retry-After, and calls and tokens
+# are counted per model. A call reserves its prompt plus max_tokens up front and
+# the unused part is returned once the real usage is known. LLMBackend=local in
+# .env swaps in an offline stand-in.
+
+# Requests and tokens per minute, per provider/model (LLMRateLimits in .env overrides these)
+RATE_LIMITS = {
+    ("groq", "llama-3.3-70b-versatile"): {"rpm": 30, "tpm": 12000},
+    ("groq", "llama-3.1-70b-versatile"): {"rpm": 30, "tpm": 6000},
+    ("groq", "llama-3.1-8b-instant"): {"rpm": 30, "tpm": 6000},
+    ("cohere", "command-r-08-2024"): {"rpm": 20, "tpm": 100000},
+}
+DEFAULT_RATE_LIMIT = {"rpm": 30, "tpm": 6000}
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def ParseRateLimits(spec):
+    """Parses "groq/llama-3.3-70b-versatile=30:12000,default=30:6000" into (limits, default)."""
+    limits, default = {}, None
+    for part in (spec or "").split(","):
+        if "=" not in part or ":" not in part:
+            continue
+        name, values = part.split("=", 1)
+        rpm, tpm = values.split(":", 1)
+        limit = {"rpm": float(rpm), "tpm": float(tpm)}
+        name = name.strip()
+        if name == "default":
+            default = limit
+        elif "/" in name:
+            limits[tuple(name.split("/", 1))] = limit
+    return limits, default
+
+
+_overrides, _default = ParseRateLimits(env_vars.get("LLMRateLimits"))
+RATE_LIMITS.update(_overrides)
+DEFAULT_RATE_LIMIT = _default or DEFAULT_RATE_LIMIT
+
+
+class LLMError(Exception):
+    """Raised when an LLM call fails after all retries."""
+
+
+# --- PROVIDERS ---
+
+class LLMProvider:
+    """Interface: stream(model, usage, **request) yields text deltas and may fill `usage`."""
+
+    def stream(self, model, usage, **request):
+        raise NotImplementedError
+
+    def warm(self):
+        """Pays one-off setup costs (SDK import, client construction) ahead of the first call."""
+
+
+class GroqProvider(LLMProvider):
+    def warm(self):
+        GetGroqClient()
+
+    def stream(self, model, usage, **request):
+        completion = GetGroqClient().chat.completions.create(model=model, stream=True, **request)
+        for chunk in completion:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            reported = getattr(getattr(chunk, "x_groq", None), "usage", None)
+            if reported is not None:
+                usage["prompt_tokens"] = reported.prompt_tokens
+                usage["completion_tokens"] = reported.completion_tokens
+
+
+class CohereProvider(LLMProvider):
+    def warm(self):
+        GetCohereClient()
+
+    def stream(self, model, usage, **request):
+        for event in GetCohereClient().chat_stream(model=model, **request):
+            if event.event_type == "text-generation":
+                yield event.text
+
+
+class LocalProvider(LLMProvider):
+    """Offline stand-in with configurable time-to-first-token and per-token delay.
+    `responder(model, request)` returns the full reply text."""
+
+    def __init__(self, responder=None, ttft=0.0, token_delay=0.0):
+        self.responder = responder or self.default_reply
+        self.ttft = ttft
+        self.token_delay = token_delay
+
+    @staticmethod
+    def default_reply(model, request):
+        if "message" in request:  # Cohere-style classification request
+            return f"general {request['message']}"
+        last = request.get("messages", [{}])[-1].get("content", "")
+        return f"This is an offline answer to: {last}"
+
+    def stream(self, model, usage, **request):
+        text = self.responder(model, request)
+        if self.ttft:
+            time.sleep(self.ttft)
+        for i, word in enumerate(text.split(" ")):
+            if i and self.token_delay:
+                time.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
+
+
+# --- RATE LIMITING ---
+
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute up to that capacity; take() blocks until available."""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, amount):
+        """Takes `amount` units, returning the seconds spent waiting."""
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def give(self, amount):
+        """Returns unused units (e.g. reserved tokens a completion didn't use)."""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + float(amount))
+
+    def drain(self, seconds):
+        """Lowers the bucket so the next single-unit request waits about `seconds` (provider said slow down)."""
+        with self.lock:
+            self.tokens = min(self.tokens, 1.0 - seconds * self.rate)
+            self.updated = time.monotonic()
+
+
+# --- ERROR CLASSIFICATION ---
+
+def _status_of(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+def RetryAfterSeconds(error):
+    """Reads Retry-After (seconds or HTTP date) from an SDK error's response, if present."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+def IsRetryable(error):
+    status = _status_of(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    name = type(error).__name__
+    return any(word in name for word in ("Connection", "Timeout", "ServiceUnavailable", "InternalServer"))
+
+
+# --- CLIENT ---
+
+class LLMClient:
+    """Rate-limited, retrying front end over the registered providers."""
+
+    def __init__(self, providers, rate_limits=None, max_retries=3, backoff_base=0.5, backoff_cap=20.0):
+        self.providers = providers
+        self.rate_limits = dict(RATE_LIMITS if rate_limits is None else rate_limits)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._buckets = {}
+        self._usage = {}
+        self._lock = threading.Lock()
+
+    def _limits(self, provider, model):
+        key = (provider, model)
+        with self._lock:
+            if key not in self._buckets:
+                limit = self.rate_limits.get(key, DEFAULT_RATE_LIMIT)
+                self._buckets[key] = (TokenBucket(limit["rpm"]), TokenBucket(limit["tpm"]))
+                self._usage[key] = {"calls": 0, "errors": 0, "retries": 0, "prompt_tokens": 0,
+                                    "completion_tokens": 0, "throttled_seconds": 0.0}
+            return self._buckets[key], self._usage[key]
+
+    def _record(self, stats, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                stats[name] += value
+
+    def stream(self, provider, model, **request):
+        """Yields text deltas for one request. Retries happen only before the first delta,
+        so a caller never sees duplicated text."""
+        (requests_bucket, tokens_bucket), stats = self._limits(provider, model)
+        prompt_text = request.get("preamble", "") + request.get("message", "") + "".join(
+            m.get("content", "") for m in request.get("messages", []))
+        prompt_tokens = EstimateTokens(prompt_text)
+        reserve = prompt_tokens + request.get("max_tokens", 256)
+        reserved = min(reserve, tokens_bucket.capacity)  # What take(reserve) actually removes
+        start = time.perf_counter()
+        ttft = None
+
+        for attempt in range(self.max_retries + 1):
+            waited = requests_bucket.take(1) + tokens_bucket.take(reserve)
+            self._record(stats, calls=1, throttled_seconds=waited)
+            usage = {}
+            produced = []
+            try:
+                for delta in self.providers[provider].stream(model, usage, **request):
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                        LLM_TTFT_SECONDS.observe(ttft, provider=provider, model=model)
+                    produced.append(delta)
+                    yield delta
+                used_prompt = usage.get("prompt_tokens", prompt_tokens)
+                used_completion = usage.get("completion_tokens", EstimateTokens("".join(produced)))
+                self._record(stats, prompt_tokens=used_prompt, completion_tokens=used_completion)
+                tokens_bucket.give(max(reserved - used_prompt - used_completion, 0))
+                seconds = time.perf_counter() - start
+                LLM_SECONDS.observe(seconds, provider=provider, model=model)
+                RecordSpan("llm", seconds, provider=provider, model=model, ttft=ttft, attempts=attempt + 1)
+                return
+            except Exception as e:
+                self._record(stats, errors=1)
+                # A failed attempt used nothing unless it already streamed text
+                used = prompt_tokens + EstimateTokens("".join(produced)) if produced else 0
+                tokens_bucket.give(max(reserved - used, 0))
+                if produced or attempt == self.max_retries or not IsRetryable(e):
+                    RecordSpan("llm", time.perf_counter() - start, error=str(e), provider=provider, model=model,
+                               ttft=ttft, attempts=attempt + 1)
+                    raise LLMError(f"{provider}/{model} request failed: {e}") from e
+                delay = RetryAfterSeconds(e)
+                if delay is not None:
+                    # The provider told us when capacity returns: hold every caller of this model
+                    # (the bucket makes the next take() wait), plus a little jitter
+                    requests_bucket.drain(delay)
+                    delay = random.uniform(0, 0.25)
+                else:
+                    delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                self._record(stats, retries=1)
+                print(f"[WARN] {provider}/{model} attempt {attempt + 1} failed ({e}); retrying")
+                time.sleep(delay)
+
+    def warm(self, provider):
+        self.providers[provider].warm()
+
+    def complete(self, provider, model, **request):
+        """Returns the full text of one request."""
+        return "".join(self.stream(provider, model, **request))
+
+    def usage(self):
+        """Calls, errors, retries, tokens and throttling time per provider/model."""
+        with self._lock:
+            return {f"{p}/{m}": dict(stats) for (p, m), stats in self._usage.items()}
+
+
+_llm = None
+_llm_lock = threading.Lock()
+
+def GetLLM():
+    """Returns the shared LLMClient (LLMBackend=local selects the offline stand-in)."""
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            if env_vars.get("LLMBackend", "").lower() == "local":
+                local = LocalProvider()
+                providers = {"groq": local, "cohere": local}
+            else:
+                providers = {"groq": GroqProvider(), "cohere": CohereProvider()}
+            _llm = LLMClient(providers)
+        return _llm
+
+def SetLLM(client):
+    """Replaces the shared LLMClient (e.g. with LocalProvider backends for offline runs)."""
+    global _llm
+    with _llm_lock:
+        _llm = client
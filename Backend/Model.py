@@ -1,25 +1,218 @@
 #Brain of AI
 
-import cohere #import the cohere library for ai services.
+import os #import os for the cache file path.
+import re #import regular expressions for the local fast-path classifier.
+import json #import json to persist the classification cache.
+import time #import time for cache expiry.
+import atexit #import atexit to save the classification cache on shutdown.
+import threading #import threading to guard the fast-path counters and cache.
+from collections import OrderedDict, deque #import containers for the lru cache and message ring buffer.
 from rich import print #import the rich library to enhance terminal outputs.
-from dotenv import dotenv_values #import dotenv to load environment variable from a .env file.
-
-#load environment variable from the .env file.
-env_vars = dotenv_values(".env")
-
-#retrive API key.
-CohereAPIKey = env_vars.get("CohereAPIKey")
-
-#create a cohere client using the provided API key.
-co = cohere.Client(api_key=CohereAPIKey)
+from Config import env_vars, Assistantname #shared config loader.
+from LLMClient import GetLLM #shared, rate-limited and retrying llm client.
 
 #Define a list of recognized function keywords for task categorization.
 funcs = [
     "exit", "general", "realtime", "open", "close", "play", "generate image", "system", "content", "google search", "youtube search", "reminder"
 ]
 
-#initialize an empty list to store user messages.
-messages = []
+#--- LOCAL FAST PATH ---
+#unambiguous commands ("volume up", "open spotify", "play let her go") are classified
+#locally in microseconds; anything uncertain falls through to the cohere model.
+
+#apps and websites that are safe to 'open'/'close' without asking the model.
+KnownApps = {
+    "chrome", "google chrome", "firefox", "edge", "microsoft edge", "notepad", "calculator", "paint",
+    "spotify", "telegram", "whatsapp", "facebook", "instagram", "twitter", "youtube", "gmail",
+    "discord", "zoom", "teams", "microsoft teams", "slack", "vlc", "word", "excel", "powerpoint",
+    "outlook", "settings", "file explorer", "explorer", "command prompt", "terminal", "vs code",
+    "vscode", "visual studio code", "steam", "netflix", "linkedin", "github", "reddit", "camera",
+}
+
+#system actions understood by Automation.System, with common phrasings.
+SystemActions = {
+    "mute": "mute", "unmute": "unmute", "volume up": "volume up", "volume down": "volume down",
+    "increase volume": "volume up", "increase the volume": "volume up", "raise the volume": "volume up",
+    "turn up the volume": "volume up", "turn the volume up": "volume up",
+    "decrease volume": "volume down", "decrease the volume": "volume down", "lower the volume": "volume down",
+    "turn down the volume": "volume down", "turn the volume down": "volume down",
+    "mute the volume": "mute", "unmute the volume": "unmute",
+}
+
+#compiled patterns for single-clause commands, tried in order; each maps to a task prefix.
+FastPatterns = [
+    (re.compile(r"^(?:open|launch|start) (?P<arg>.+)$"), "open"),
+    (re.compile(r"^(?:close|quit|exit) (?P<arg>.+)$"), "close"),
+    #only with an explicit song or YouTube marker; "play a game with me" is for the model.
+    (re.compile(r"^play (?:the )?(?:song|track) (?P<arg>.+?)(?: on youtube)?$"), "play"),
+    (re.compile(r"^play (?P<arg>.+?) (?:song|on youtube)$"), "play"),
+    (re.compile(r"^(?:youtube search|search youtube for|search on youtube for) (?P<arg>.+)$"), "youtube search"),
+    (re.compile(r"^search (?:for )?(?P<arg>.+) on youtube$"), "youtube search"),
+    #not a bare "google ...": "google is better than bing" is a statement, not a search.
+    (re.compile(r"^(?:google search|search google for|search on google for) (?P<arg>.+)$"), "google search"),
+    (re.compile(r"^search (?:for )?(?P<arg>.+) on google$"), "google search"),
+    (re.compile(r"^(?:generate|create|make|draw) (?:an? )?(?:image|picture|photo|drawing) of (?P<arg>.+)$"), "generate image"),
+]
+
+#clauses are split on commas, 'and' and 'then'; trailing punctuation and politeness are dropped.
+ClauseSplit = re.compile(r"\s*(?:,|;|\band then\b|\bthen\b|\band\b)\s*")
+Politeness = re.compile(r"^(?:please |can you |could you |would you |hey \w+,? )+|(?: please| for me)+$")
+#only goodbyes, optionally addressed to the assistant ("bye sara"); "exit chrome" is a close command.
+ExitPhrase = re.compile(
+    r"^(?:bye|goodbye|good bye|see you|exit)(?: (?:now|then|for now|later|"
+    + re.escape((Assistantname or "assistant").lower()) + r"))?$"
+)
+
+FastPathStats = {"hits": 0, "misses": 0}
+FastPathLock = threading.Lock()
+
+#classify one clause; 'previous' is the prefix of the clause before it ("open chrome and spotify").
+def FastClassifyClause(clause: str, previous: str = None):
+    clause = Politeness.sub("", clause).strip()
+    if clause in SystemActions:
+        return f"system {SystemActions[clause]}"
+    for pattern, prefix in FastPatterns:
+        match = pattern.match(clause)
+        if match:
+            arg = match.group("arg").strip()
+            if prefix in ("open", "close"):
+                arg = arg.removeprefix("the ")
+                return f"{prefix} {arg}" if arg in KnownApps else None
+            return f"{prefix} {arg}" if arg else None
+    #a bare known app continues an open/close list ("open chrome and spotify").
+    if previous in ("open", "close") and clause.removeprefix("the ") in KnownApps:
+        return f"{previous} {clause.removeprefix('the ')}"
+    return None
+
+#match a command locally without touching the counters (None when uncertain).
+def FastMatch(prompt: str):
+    text = prompt.lower().strip()
+    if text.endswith("?"):
+        return None  # A question, even one shaped like a command, goes to the model
+    text = text.rstrip(".!").strip()
+    if ExitPhrase.match(text):
+        return ["exit"]
+    tasks = []
+    previous = None
+    for clause in ClauseSplit.split(text):
+        if not clause:
+            continue
+        task = FastClassifyClause(clause, previous)
+        if task is None:
+            return None
+        tasks.append(task)
+        previous = next(func for func in funcs if task.startswith(func))
+    return tasks or None
+
+#return the task list for an unambiguous command, or None when the model should decide.
+def FastClassify(prompt: str):
+    tasks = FastMatch(prompt)
+    with FastPathLock:
+        FastPathStats["hits" if tasks else "misses"] += 1
+    return tasks
+
+#report fast-path hits, misses and hit rate.
+def FastPathReport():
+    with FastPathLock:
+        total = FastPathStats["hits"] + FastPathStats["misses"]
+        return {**FastPathStats, "hit_rate": FastPathStats["hits"] / total if total else 0.0}
+
+#--- CLASSIFICATION CACHE ---
+#identical or near-identical queries (case, whitespace and punctuation folded) reuse the
+#model's earlier classification; entries expire after a ttl and the least recently used are evicted.
+
+ClassificationCacheSize = int(env_vars.get("ClassificationCacheSize", 1024))
+ClassificationCacheTTL = float(env_vars.get("ClassificationCacheTTL", 86400))
+ClassificationCacheFile = env_vars.get("ClassificationCacheFile", "") #empty disables persistence.
+
+PunctuationFold = re.compile(r"[^\w\s]+")
+
+#fold case, punctuation and whitespace so trivially different queries share a cache key.
+def NormalizeQuery(prompt: str) -> str:
+    return " ".join(PunctuationFold.sub(" ", prompt.lower()).split())
+
+class ClassificationCache:
+    def __init__(self, maxsize=1024, ttl=86400.0, path=""):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() #key -> (expires_at, tasks)
+        self._lock = threading.Lock()
+        self._dirty = 0
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    def get(self, prompt):
+        key = NormalizeQuery(prompt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[1])
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, prompt, tasks):
+        key = NormalizeQuery(prompt)
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, list(tasks))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self._dirty += 1
+            flush = self.path and self._dirty >= 50
+        if flush:
+            self.save()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0}
+
+    #write unexpired entries atomically (temp file + rename).
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            now = time.time()
+            data = [[k, exp, tasks] for k, (exp, tasks) in self._entries.items() if exp > now]
+            self._dirty = 0
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path + ".tmp", "w") as f:
+                json.dump(data, f)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            print(f"Could not save classification cache: {e}")
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        with self._lock:
+            for key, expires, tasks in data[-self.maxsize:]:
+                if expires > now:
+                    self._entries[key] = (expires, tasks)
+
+classification_cache = ClassificationCache(ClassificationCacheSize, ClassificationCacheTTL, ClassificationCacheFile)
+
+#report fast-path and cache effectiveness together.
+def ClassifierReport():
+    return {"fast_path": FastPathReport(), "cache": classification_cache.stats()}
+
+#keep only the most recent user messages (a fixed-size ring buffer, not an ever-growing list).
+MaxMessages = 100
+messages = deque(maxlen=MaxMessages)
 
 #Define the preamble that guides the AI model on how to categorize queries.
 preamble = """
@@ -58,14 +251,30 @@ ChatHistory = [
     {"role": "Chatbot","message": "general chat with me"},
 ]
 
+#build the shared llm client ahead of the first query.
+def Warmup():
+    GetLLM().warm("cohere")
+
 #define the main function for decision-making on queries.
 def FirstLayerDMM(prompt: str = "test", max_retries=2):
     #add the user's query to the meage list.
     messages.append({"role":"user","content":f"{prompt}"})
 
+    #answer unambiguous commands locally without a cohere round trip (only on the first attempt).
+    if max_retries == 2:
+        fast = FastClassify(prompt)
+        if fast is not None:
+            return fast
+
+        #reuse an earlier classification of the same (normalized) query.
+        cached = classification_cache.get(prompt)
+        if cached is not None:
+            return cached
+
     #create a streaming chat sesssion with the cohere model.
-    stream = co.chat_stream(
-        model='command-r-08-2024', # UPDATED MODEL
+    stream = GetLLM().stream(
+        "cohere", #route through the shared llm client (retries, rate limits, usage).
+        'command-r-08-2024', # UPDATED MODEL
         message=prompt, #pass the user's query
         temperature=0.7, #set the creativity level of the model.
         chat_history=ChatHistory, #provide the predefined chat history for context.
@@ -77,10 +286,9 @@ def FirstLayerDMM(prompt: str = "test", max_retries=2):
     #initialize an empty string to store the generated response.
     response = ""
 
-    #iterate over events in the stream and capture text generation events.
-    for event in stream:
-        if event.event_type == "text-generation":
-          response += event.text #append generated text to the response.
+    #iterate over the streamed text deltas.
+    for text in stream:
+        response += text #append generated text to the response.
 
     #remove newline character and split reponses into individual tasks.
     response = response.replace("\n", "")
@@ -106,6 +314,8 @@ def FirstLayerDMM(prompt: str = "test", max_retries=2):
        newresponse = FirstLayerDMM(prompt=prompt, max_retries=max_retries -1)
        return newresponse #return the clarified reponse.
     else:
+       if response and "(query)" not in response:
+          classification_cache.put(prompt, response) #remember the classification for repeats.
        return response #return the filtered reponse.
     
 #entry point of the script
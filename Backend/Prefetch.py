@@ -0,0 +1,90 @@
+import re
+import threading
+from difflib import SequenceMatcher
+
+from Telemetry import Bind
+
+# --- SPECULATIVE SEARCH PREFETCH ---
+# Queries that look realtime on a cheap local check start their web search while
+# FirstLayerDMM is still classifying. If the classification comes back with a
+# single realtime task whose prompt is (nearly) the query that was searched, the
+# running search is handed to RealtimeSearchEngine; otherwise it is discarded (its
+# results still land in the search cache). "open chrome and tell me the latest news
+# about Tesla" searched the whole sentence, so its realtime task searches afresh.
+
+_REALTIME_HINT_RE = re.compile(
+    r"\b(news|latest|today|tonight|current(ly)?|headlines?|recent(ly)?|update|score|weather|price|stock|"
+    r"who (is|was|won)|what happened|when (is|was|did)|where is|right now)\b",
+    re.IGNORECASE,
+)
+# A capitalised word after the first one, e.g. "tell me about Emma Stone"
+_PROPER_NOUN_RE = re.compile(r"(?<!^)(?<![.!?]\s)\b[A-Z][a-z]+")
+# How closely the realtime task's prompt must match the searched query to reuse its results
+HANDOFF_SIMILARITY = 0.8
+
+
+def _normalize(text):
+    return " ".join(re.sub(r"[^\w\s]+", " ", text.lower()).split())
+
+
+def LooksRealtime(query):
+    """Cheap local guess that a query needs a web search."""
+    return bool(_REALTIME_HINT_RE.search(query) or _PROPER_NOUN_RE.search(query.strip()))
+
+
+class SearchPrefetcher:
+    """Starts speculative searches on an executor and hands them off or discards them."""
+
+    def __init__(self, executor, search_fn, skip=None, wait_timeout=10.0):
+        self.executor = executor
+        self.search_fn = search_fn  # query -> results
+        self.skip = skip  # query -> True when the query is known not to need a search
+        self.wait_timeout = wait_timeout
+        self.stats = {"checked": 0, "started": 0, "handed_off": 0, "wasted": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def start(self, query):
+        """Returns a Future for the speculative search, or None if the query doesn't look realtime."""
+        self._count("checked")
+        if not LooksRealtime(query) or (self.skip and self.skip(query)):
+            return None
+        self._count("started")
+        return self.executor.submit(Bind(self.search_fn), query)
+
+    def claim(self, future, tasks, query):
+        """Maps the single realtime task to the prefetch of `query` if classification agrees and the task
+        asks (nearly) the same thing; counts waste otherwise."""
+        if future is None:
+            return {}
+        realtime = [t for t in tasks if t.startswith("realtime")]
+        if len(realtime) == 1 and self.matches(query, realtime[0].removeprefix("realtime")):
+            self._count("handed_off")
+            return {realtime[0]: future}
+        self._count("wasted")
+        return {}
+
+    @staticmethod
+    def matches(query, prompt):
+        """True when the task prompt is close enough to the searched query for its results to fit."""
+        return SequenceMatcher(None, _normalize(query), _normalize(prompt)).ratio() >= HANDOFF_SIMILARITY
+
+    def result(self, future):
+        """Waits for a handed-off prefetch; None means fall back to a normal search."""
+        try:
+            return future.result(timeout=self.wait_timeout)
+        except Exception:
+            self._count("failed")
+            return None
+
+    def report(self):
+        with self._lock:
+            started = self.stats["started"]
+            return dict(
+                self.stats,
+                hit_rate=self.stats["handed_off"] / started if started else 0.0,
+                waste_rate=self.stats["wasted"] / started if started else 0.0,
+            )
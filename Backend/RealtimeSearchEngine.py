@@ -1,27 +1,18 @@
-import os
 import datetime
-from json import load, dump
-from dotenv import dotenv_values
-from groq import Groq
-from googlesearch import search  # Make sure to install: pip install googlesearch-python
+from SearchCache import SearchCache, ParseTTLs
+from Config import env_vars, Username, Assistantname
+from LLMClient import GetLLM
+from ChatLogStore import GetChatLog
+from ContextBuilder import context_builder
 
 # --- SETUP ---
 
-# Ensure 'Data' folder exists
-os.makedirs("Data", exist_ok=True)
-
-# Load environment variables
-env_vars = dotenv_values(".env")
-Username = env_vars.get("Username", "User")
-Assistantname = env_vars.get("Assistantname", "SARA")
-GroqAPIKey = env_vars.get("GroqAPIKey")
-
-if not GroqAPIKey:
+# Credentials come from Config; requests go through the shared, rate-limited LLM client
+if not env_vars.get("GroqAPIKey"):
     print("Error: GroqAPIKey not found in .env file.")
-    exit()
 
-# Initialize Groq client
-client = Groq(api_key=GroqAPIKey)
+# Model used for answers; ContextBuilder fits search results and history into its budget
+MODEL = "llama-3.3-70b-versatile"
 
 # --- SYSTEM PROMPT ---
 
@@ -39,27 +30,35 @@ SystemChatBot = [
 
 # --- HELPERS ---
 
-def load_chat_log():
-    try:
-        with open("Data/ChatLog.json", "r") as f:
-            return load(f)
-    except (FileNotFoundError, ValueError):
-        return []
+def Warmup():
+    """Builds the shared LLM client and loads the chat log ahead of the first query."""
+    GetLLM().warm("groq")
+    GetChatLog()
+
+def load_chat_log(session_id=None):
+    """Recent conversation of `session_id` from its chat log."""
+    return GetChatLog(session_id).recent()
+
+def save_turn(prompt, answer, session_id=None):
+    """Appends one user/assistant turn to `session_id`'s chat log."""
+    GetChatLog(session_id).append({"role": "user", "content": prompt}, {"role": "assistant", "content": answer})
+
+# Cached, de-duplicated web search (swap `search_cache.provider` for a FakeSearchProvider offline)
+search_cache = SearchCache(
+    ttls=ParseTTLs(env_vars.get("SearchCacheTTLs")),
+    max_bytes=int(float(env_vars.get("SearchCacheMB", 4)) * (1 << 20)),
+)
 
-def save_chat_log(messages):
-    with open("Data/ChatLog.json", "w") as f:
-        dump(messages, f, indent=4)
+def FormatSearchResults(query, results):
+    output = f"The search results for '{query}' are:\n[start]\n"
+    for result in results:
+        output += f"Title: {result['title']}\nDescription: {result['description']}\n\n"
+    output += "[end]"
+    return output
 
 def GoogleSearch(query):
     try:
-        results = list(search(query, advanced=True, num_results=5))
-        output = f"The search results for '{query}' are:\n[start]\n"
-        for result in results:
-            title = getattr(result, "title", "No title available")
-            description = getattr(result, "description", "No description available")
-            output += f"Title: {title}\nDescription: {description}\n\n"
-        output += "[end]"
-        return output
+        return FormatSearchResults(query, search_cache.search(query))
     except Exception as e:
         return f"Google search failed: {e}"
 
@@ -78,43 +77,46 @@ Time: {now.strftime("%H")} hours, {now.strftime("%M")} minutes, {now.strftime("%
 
 # --- MAIN FUNCTION ---
 
-def RealtimeSearchEngine(prompt):
+def RealtimeSearchEngine(prompt, on_token=None, search_results=None, session_id=None):
+    """Answers a realtime query in `session_id`'s conversation (None = the local CLI one).
+    If given, `on_token(text)` is called with each streamed delta; `search_results`
+    (e.g. from a speculative prefetch) replaces the search for `prompt`."""
     global SystemChatBot
 
-    messages = load_chat_log()
+    messages = load_chat_log(session_id)
 
-    # Do the search only once
-    search_result = GoogleSearch(prompt)
+    # Do the search only once (or reuse the prefetched results)
+    if search_results is not None:
+        search_result = FormatSearchResults(prompt, search_results)
+    else:
+        search_result = GoogleSearch(prompt)
 
-    # Add search result to system prompt context, not to chat history
-    full_prompt = (
-        SystemChatBot
-        + [{"role": "system", "content": search_result}]
-        + [{"role": "system", "content": RealtimeInformation()}]
-        + messages
-        + [{"role": "user", "content": prompt}]
+    # Add search result to system prompt context, not to chat history; everything is
+    # fitted into the model's token budget and older turns are summarized
+    full_prompt = context_builder.build(
+        MODEL, SystemChatBot, prompt, messages, search=search_result, realtime=RealtimeInformation(),
+        session_id=session_id,
     )
 
     # Generate response using Groq
     try:
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",  # ✅ Updated model
+        completion = GetLLM().stream(
+            "groq",
+            MODEL,  # ✅ Updated model
             messages=full_prompt,
             temperature=0.7,
             max_tokens=2048,
-            top_p=1,
-            stream=True
+            top_p=1
         )
 
         Answer = ""
-        for chunk in completion:
-            if chunk.choices[0].delta.content:
-                Answer += chunk.choices[0].delta.content
+        for delta in completion:
+            Answer += delta
+            if on_token:
+                on_token(delta)
 
         Answer = Answer.strip().replace("</s>", "")
-        messages.append({"role": "user", "content": prompt})
-        messages.append({"role": "assistant", "content": Answer})
-        save_chat_log(messages)
+        save_turn(prompt, Answer, session_id)
         return AnswerModifier(Answer)
 
     except Exception as e:
@@ -0,0 +1,173 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from Telemetry import Span
+
+# --- WEB SEARCH WITH CACHING ---
+# RealtimeSearchEngine looks results up through a SearchCache wrapped around a
+# SearchProvider. Results are cached per normalized query with a TTL chosen by
+# query class (news goes stale in minutes, biographies in days), the cache is
+# bounded by an estimate of its memory use, and concurrent identical lookups
+# share a single in-flight request.
+
+
+class SearchProvider:
+    """Interface for web search backends."""
+
+    def search(self, query, num_results=5):
+        """Returns a list of {"title", "description", "url"} dicts."""
+        raise NotImplementedError
+
+
+class GoogleSearchProvider(SearchProvider):
+    """Live results from the googlesearch-python package."""
+
+    def search(self, query, num_results=5):
+        from googlesearch import search  # Make sure to install: pip install googlesearch-python
+        return [
+            {
+                "title": getattr(r, "title", "No title available"),
+                "description": getattr(r, "description", "No description available"),
+                "url": getattr(r, "url", ""),
+            }
+            for r in search(query, advanced=True, num_results=num_results)
+        ]
+
+
+class FakeSearchProvider(SearchProvider):
+    """Deterministic offline provider for tests and benchmarks."""
+
+    def __init__(self, results=None, latency=0.0):
+        self.results = results or {}
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def search(self, query, num_results=5):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if query in self.results:
+            return self.results[query][:num_results]
+        return [
+            {"title": f"Result {i + 1} for {query}", "description": f"Offline description {i + 1} about {query}.",
+             "url": f"https://example.com/{i + 1}"}
+            for i in range(num_results)
+        ]
+
+
+# --- QUERY CLASSES ---
+
+_NEWS_RE = re.compile(r"\b(news|today|tonight|latest|current|now|headlines?|score|weather|price|stock|live|"
+                      r"this (week|month|year)|yesterday|recent(ly)?|update)\b")
+_BIO_RE = re.compile(r"\b(who (is|was)|biography|born|history of|founder of|founded)\b")
+
+# Seconds a result stays fresh, per query class
+SEARCH_TTLS = {"news": 300, "general": 3600, "bio": 7 * 86400}
+
+
+def ParseTTLs(spec):
+    """Parses "news:300,general:3600,bio:604800" into a TTL dict."""
+    ttls = {}
+    for part in (spec or "").split(","):
+        if ":" in part:
+            name, seconds = part.split(":", 1)
+            ttls[name.strip()] = float(seconds)
+    return ttls
+
+
+def ClassifyQuery(query):
+    """Returns 'news', 'bio' or 'general' for TTL selection."""
+    if _NEWS_RE.search(query):
+        return "news"
+    if _BIO_RE.search(query):
+        return "bio"
+    return "general"
+
+
+def NormalizeQuery(query):
+    """Folds case, punctuation and whitespace ("Today's news?" -> "todays news")."""
+    return " ".join(re.sub(r"[^\w\s]+", " ", re.sub(r"['’]", "", query.lower())).split())
+
+
+def _size_of(results):
+    return 64 + sum(len(r.get("title", "")) + len(r.get("description", "")) + len(r.get("url", "")) + 64
+                    for r in results)
+
+
+class SearchCache:
+    """TTL + LRU result cache with single-flight deduplication, bounded by approximate bytes."""
+
+    def __init__(self, provider=None, ttls=None, max_bytes=4 << 20, num_results=5):
+        self.provider = provider or GoogleSearchProvider()
+        self.ttls = dict(SEARCH_TTLS, **(ttls or {}))
+        self.max_bytes = max_bytes
+        self.num_results = num_results
+        self._entries = OrderedDict()  # key -> (expires_at, size, results)
+        self._bytes = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "errors": 0}
+
+    def search(self, query):
+        """Returns cached results or performs (or joins) a provider lookup."""
+        key = NormalizeQuery(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[2]
+            if entry:
+                self._drop(key)
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                owner = False
+            else:
+                future = self._in_flight[key] = Future()
+                self.stats["misses"] += 1
+                owner = True
+
+        if not owner:
+            return future.result()
+
+        try:
+            with Span("search", query_class=ClassifyQuery(key)):
+                results = self.provider.search(query, num_results=self.num_results)
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._store(key, ClassifyQuery(key), results)
+            del self._in_flight[key]
+        future.set_result(results)
+        return results
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes)
+
+    def _store(self, key, query_class, results):
+        size = _size_of(results)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttls[query_class], size, results)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.stats["evictions"] += 1
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
@@ -0,0 +1,228 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# --- SESSION STATE BACKENDS ---
+# Every browser session owns a status string, an append-only chat history and a
+# version counter that is bumped on each change (the /updates cursor and ETag).
+
+
+class SessionStore:
+    """Interface for session-scoped conversation state."""
+
+    def __init__(self, greeting=None):
+        self.greeting = list(greeting or [])
+
+    def version(self, session_id) -> int:
+        """Returns the session's current state version."""
+        raise NotImplementedError
+
+    def set_status(self, session_id, status) -> None:
+        """Updates the status, bumping the version only if it changed."""
+        raise NotImplementedError
+
+    def append_message(self, session_id, message) -> int:
+        """Appends a message dict and returns its index in the history."""
+        raise NotImplementedError
+
+    def snapshot(self, session_id, since=0) -> dict:
+        """Returns version, status, history length and messages from index `since` onward."""
+        raise NotImplementedError
+
+
+class _MemorySession:
+    def __init__(self, greeting):
+        self.status = "Idle"
+        self.version = 0
+        self.history = [dict(m) for m in greeting]
+        self.lock = threading.Lock()
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local store; the least recently used sessions are evicted past `max_sessions`."""
+
+    def __init__(self, greeting=None, max_sessions=1000):
+        super().__init__(greeting)
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._guard = threading.Lock()
+
+    def _get(self, session_id):
+        with self._guard:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _MemorySession(self.greeting)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def version(self, session_id):
+        session = self._get(session_id)
+        with session.lock:
+            return session.version
+
+    def set_status(self, session_id, status):
+        session = self._get(session_id)
+        with session.lock:
+            if session.status != status:
+                session.status = status
+                session.version += 1
+
+    def append_message(self, session_id, message):
+        session = self._get(session_id)
+        with session.lock:
+            session.history.append(message)
+            session.version += 1
+            return len(session.history) - 1
+
+    def snapshot(self, session_id, since=0):
+        session = self._get(session_id)
+        with session.lock:
+            return {
+                "version": session.version,
+                "status": session.status,
+                "total": len(session.history),
+                "messages": session.history[since:],
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite (WAL) store so several server processes can share sessions."""
+
+    def __init__(self, path, greeting=None):
+        super().__init__(greeting)
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._locks = {}  # session id -> [lock, writers holding or waiting for it]
+        self._guard = threading.Lock()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY, status TEXT NOT NULL, version INTEGER NOT NULL, updated REAL NOT NULL)""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS messages (
+            session_id TEXT NOT NULL, idx INTEGER NOT NULL, data TEXT NOT NULL,
+            PRIMARY KEY (session_id, idx))""")
+
+    def _conn(self):
+        # One connection per thread; autocommit mode with explicit transactions
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _lock(self, session_id):
+        # Serialises writers of one session within this process; SQLite handles other processes.
+        # Locks are reference-counted and dropped once no writer holds or awaits them.
+        with self._guard:
+            entry = self._locks.get(session_id)
+            if entry is None:
+                entry = self._locks[session_id] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[session_id]
+
+    def _ensure(self, conn, session_id):
+        """Creates the session row (and greeting) inside the caller's write transaction."""
+        created = conn.execute(
+            "INSERT OR IGNORE INTO sessions (id, status, version, updated) VALUES (?, 'Idle', 0, ?)",
+            (session_id, time.time()),
+        ).rowcount
+        if created:
+            conn.executemany(
+                "INSERT INTO messages (session_id, idx, data) VALUES (?, ?, ?)",
+                [(session_id, i, json.dumps(m)) for i, m in enumerate(self.greeting)],
+            )
+
+    def _write(self, session_id, fn):
+        conn = self._conn()
+        with self._lock(session_id):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._ensure(conn, session_id)
+                result = fn(conn)
+                conn.execute("COMMIT")
+                return result
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def version(self, session_id):
+        row = self._conn().execute("SELECT version FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def set_status(self, session_id, status):
+        def update(conn):
+            conn.execute(
+                "UPDATE sessions SET status = ?, version = version + 1, updated = ? WHERE id = ? AND status != ?",
+                (status, time.time(), session_id, status),
+            )
+        self._write(session_id, update)
+
+    def append_message(self, session_id, message):
+        def insert(conn):
+            idx = conn.execute(
+                "SELECT COALESCE(MAX(idx) + 1, 0) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT INTO messages (session_id, idx, data) VALUES (?, ?, ?)",
+                (session_id, idx, json.dumps(message)),
+            )
+            conn.execute(
+                "UPDATE sessions SET version = version + 1, updated = ? WHERE id = ?",
+                (time.time(), session_id),
+            )
+            return idx
+        return self._write(session_id, insert)
+
+    def snapshot(self, session_id, since=0):
+        conn = self._conn()
+        row = conn.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            self._write(session_id, lambda conn: None)
+        # A read transaction gives a consistent view across both tables under WAL
+        conn.execute("BEGIN")
+        try:
+            status, version = conn.execute(
+                "SELECT status, version FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            total = conn.execute(
+                "SELECT COALESCE(MAX(idx) + 1, 0) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            rows = conn.execute(
+                "SELECT data FROM messages WHERE session_id = ? AND idx >= ? ORDER BY idx",
+                (session_id, since),
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        return {
+            "version": version,
+            "status": status,
+            "total": total,
+            "messages": [json.loads(data) for (data,) in rows],
+        }
+
+
+def CreateSessionStore(backend="memory", path=os.path.join("Data", "Sessions.db"), greeting=None):
+    """Builds the configured session store backend ('memory' or 'sqlite')."""
+    if backend == "sqlite":
+        return SQLiteSessionStore(path, greeting=greeting)
+    if backend == "memory":
+        return MemorySessionStore(greeting=greeting)
+    raise ValueError(f"Unknown session backend: {backend}")
@@ -1,21 +1,24 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from dotenv import dotenv_values
 import os
-import mtranslate as mt
+import threading
+import time
+import wave
+from Config import env_vars, ROOT_DIR
+from Translator import Translator
 
 # --- SETUP ---
-# Get the absolute path of the project's root directory
-ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-
-# Load environment variables from the root .env file
-env_vars = dotenv_values(os.path.join(ROOT_DIR, ".env"))
+# Project root and .env values come from the shared Config loader
 InputLanguage = env_vars.get("InputLanguage")
 
+# Listening gives up after VoiceTimeout seconds without a transcript, and ends
+# VoiceSilence seconds after the last recognized words.
+VOICE_TIMEOUT = float(env_vars.get("VoiceTimeout", 10))
+VOICE_SILENCE = float(env_vars.get("VoiceSilence", 1.0))
+
 # --- HTML CODE ---
+# The page keeps recognizing until awaitTranscript() hands the transcript to its
+# callback: after `silenceMs` without new results, or empty-handed after `timeoutMs`.
+# Python waits on that callback through execute_async_script, so listening costs one
+# WebDriver round trip instead of a polling loop.
 HtmlCode = '''<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -28,21 +31,51 @@ HtmlCode = '''<!DOCTYPE html>
     <script>
         const output = document.getElementById('output');
         let recognition;
+        let listening = false;
+        let finalText = "";
+        let onActivity = null;
         function startRecognition() {
+            finalText = "";
+            output.textContent = "";
+            listening = true;
             recognition = new webkitSpeechRecognition() || new SpeechRecognition();
             recognition.lang = '';
             recognition.continuous = true;
+            recognition.interimResults = true;
             recognition.onresult = function(event) {
-                const transcript = event.results[event.results.length - 1][0].transcript;
-                output.textContent += transcript;
+                for (let i = event.resultIndex; i < event.results.length; i++) {
+                    if (event.results[i].isFinal) {
+                        finalText += event.results[i][0].transcript;
+                    }
+                }
+                output.textContent = finalText;
+                if (onActivity) { onActivity(); }
             };
-            recognition.onend = function() { recognition.start(); };
+            recognition.onend = function() { if (listening) { recognition.start(); } };
             recognition.start();
         }
         function stopRecognition() {
-            recognition.stop();
+            listening = false;
+            if (recognition) { recognition.stop(); }
             output.innerHTML = "";
         }
+        function awaitTranscript(timeoutMs, silenceMs, done) {
+            let silenceTimer = null;
+            const finish = function() {
+                clearTimeout(overallTimer);
+                clearTimeout(silenceTimer);
+                onActivity = null;
+                const text = finalText.trim();
+                stopRecognition();
+                done(text);
+            };
+            const overallTimer = setTimeout(finish, timeoutMs);
+            onActivity = function() {
+                clearTimeout(silenceTimer);
+                if (finalText.trim()) { silenceTimer = setTimeout(finish, silenceMs); }
+            };
+            onActivity();
+        }
     </script>
 </body>
 </html>'''
@@ -53,20 +86,273 @@ HtmlCode = str(HtmlCode).replace("recognition.lang = '';", f"recognition.lang =
 VOICE_HTML_PATH = os.path.join(ROOT_DIR, "Data", "Voice.html")
 TEMP_DIR_PATH = os.path.join(ROOT_DIR, "Frontend", "Files")
 
-# Write the modified HTML code to a file
-with open(VOICE_HTML_PATH, "w") as f:
-    f.write(HtmlCode)
+# --- RECOGNIZERS ---
+# SpeechRecognition() listens through a Recognizer. The browser one leases a session
+# from a small pool of warm headless Chromes running the Web Speech API, so
+# concurrent voice requests each get their own page; VoiceInputFile in .env swaps in FileRecognizer, which replays
+# transcripts from disk so voice latency and CPU use can be measured offline.
+
+
+class Recognizer:
+    """Interface for speech recognizers."""
+
+    def listen(self, timeout=VOICE_TIMEOUT, silence=VOICE_SILENCE):
+        """Blocks until an utterance is recognized; returns its raw transcript, or "" on timeout."""
+        raise NotImplementedError
+
+    def warmup(self):
+        """Pays one-off start-up costs ahead of the first listen()."""
+
+
+class NoVoiceSession(Exception):
+    """Raised when every browser session stays leased for longer than the lease timeout."""
+
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+def ChromeDriverPath():
+    """Installs chromedriver and writes the recognition page, once per process; returns the driver path."""
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+            os.makedirs(os.path.dirname(VOICE_HTML_PATH), exist_ok=True)
+            with open(VOICE_HTML_PATH, "w") as f:
+                f.write(HtmlCode)
+            _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+
+class BrowserSession:
+    """One headless Chrome with the recognition page loaded; used by one request at a time."""
+
+    def __init__(self):
+        self.driver = None
+        self.listens = 0
+
+    def start(self):
+        """Launches Chrome and loads the recognition page."""
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.chrome.options import Options
+
+        chrome_options = Options()
+        user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.142.86 Safari/537.36"
+        chrome_options.add_argument(f'user-agent={user_agent}')
+        chrome_options.add_argument("--use-fake-ui-for-media-stream")
+        chrome_options.add_argument("--use-fake-device-for-media-stream")
+        chrome_options.add_argument("--headless=new")
+
+        self.driver = webdriver.Chrome(service=Service(ChromeDriverPath()), options=chrome_options)
+        self.driver.get("file:///" + VOICE_HTML_PATH)
+        return self
+
+    def healthy(self):
+        """True if the browser answers and still has the recognition page loaded."""
+        try:
+            return self.driver.execute_script("return typeof awaitTranscript === 'function';") is True
+        except Exception:
+            return False
+
+    def listen(self, timeout=VOICE_TIMEOUT, silence=VOICE_SILENCE):
+        # startRecognition() resets the page's state, so the page is not reloaded between requests
+        self.driver.set_script_timeout(timeout + 5)  # The page's own timeout fires first
+        self.driver.execute_script("startRecognition();")
+        self.listens += 1
+        return self.driver.execute_async_script(
+            "awaitTranscript(arguments[0], arguments[1], arguments[arguments.length - 1]);",
+            int(timeout * 1000), int(silence * 1000)) or ""
+
+    def close(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+
+class BrowserSessionPool(Recognizer):
+    """Web Speech API in up to `size` pre-warmed headless Chrome sessions, each leased to one
+    request at a time. Sessions are health-checked when leased and while idle, and a session
+    that fails or crashes is replaced in the background."""
 
-# --- WEBDRIVER SETUP ---
-chrome_options = Options()
-user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.142.86 Safari/537.36"
-chrome_options.add_argument(f'user-agent={user_agent}')
-chrome_options.add_argument("--use-fake-ui-for-media-stream")
-chrome_options.add_argument("--use-fake-device-for-media-stream")
-chrome_options.add_argument("--headless=new")
+    def __init__(self, size=2, lease_timeout=5.0, health_interval=30.0):
+        self.size = max(size, 1)
+        self.lease_timeout = lease_timeout
+        self.health_interval = health_interval
+        self._idle = []
+        self._total = 0  # Idle, leased and starting sessions
+        self._cond = threading.Condition()
+        self._monitor = None
+        self.stats = {"leases": 0, "waits": 0, "timeouts": 0, "started": 0, "restarts": 0}
 
-service = Service(ChromeDriverManager().install())
-driver = webdriver.Chrome(service=service, options=chrome_options)
+    def warmup(self):
+        """Starts every session in parallel and waits for them."""
+        self._start_monitor()
+        threads = []
+        with self._cond:
+            while self._total < self.size:
+                self._total += 1
+                thread = threading.Thread(target=self._start_session, name="voice-session", daemon=True)
+                thread.start()
+                threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+    def listen(self, timeout=VOICE_TIMEOUT, silence=VOICE_SILENCE):
+        session = self._lease()
+        try:
+            text = session.listen(timeout, silence)
+        except Exception:
+            self._discard(session)
+            raise
+        self._release(session)
+        return text
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self.stats, size=self.size, sessions=self._total, idle=len(self._idle))
+
+    # --- Internals ---
+
+    def _lease(self):
+        self._start_monitor()
+        deadline = time.monotonic() + self.lease_timeout
+        with self._cond:
+            self.stats["leases"] += 1
+            while True:
+                if self._idle:
+                    session = self._idle.pop()
+                    break
+                if self._total < self.size:
+                    self._total += 1
+                    session = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats["timeouts"] += 1
+                    raise NoVoiceSession(f"All {self.size} voice sessions are busy.")
+                self.stats["waits"] += 1
+                self._cond.wait(remaining)
+        if session is None or not session.healthy():
+            if session is not None:
+                session.close()
+                with self._cond:
+                    self.stats["restarts"] += 1
+            try:
+                session = self._new_session()
+            except Exception:
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+                raise
+        return session
+
+    def _release(self, session):
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    def _discard(self, session):
+        """Drops a failed session and starts its replacement in the background."""
+        session.close()
+        with self._cond:
+            self.stats["restarts"] += 1
+        threading.Thread(target=self._start_session, name="voice-session", daemon=True).start()
+
+    def _new_session(self):
+        session = BrowserSession().start()
+        with self._cond:
+            self.stats["started"] += 1
+        return session
+
+    def _start_session(self):
+        """Fills a reserved slot (self._total already counts it) with a new idle session."""
+        try:
+            self._release(self._new_session())
+        except Exception as e:
+            print(f"[WARN] Could not start a voice session: {e}")
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+
+    def _start_monitor(self):
+        with self._cond:
+            if self._monitor is None:
+                self._monitor = threading.Thread(target=self._check_idle, name="voice-health", daemon=True)
+                self._monitor.start()
+
+    def _check_idle(self):
+        while True:
+            time.sleep(self.health_interval)
+            with self._cond:
+                idle = list(self._idle)
+            # One session at a time is taken out for its check; the rest stay leasable
+            for session in idle:
+                with self._cond:
+                    if session not in self._idle:
+                        continue  # Leased (and checked) in the meantime
+                    self._idle.remove(session)
+                if session.healthy():
+                    self._release(session)
+                else:
+                    self._discard(session)
+
+
+class FileRecognizer(Recognizer):
+    """Offline stand-in that replays utterances from a .txt file (one per line) or from a .wav
+    with a .txt transcript beside it. Each listen() takes `latency` seconds (by default the
+    length of the WAV, as if spoken live) plus the silence window."""
+
+    def __init__(self, path, latency=None):
+        self.path = path
+        base, ext = os.path.splitext(path)
+        with open(base + ".txt" if ext.lower() == ".wav" else path, encoding="utf-8") as f:
+            self.transcripts = [line.strip() for line in f if line.strip()]
+        if latency is None:
+            latency = 0.0
+            if ext.lower() == ".wav":
+                with wave.open(path, "rb") as audio:
+                    latency = audio.getnframes() / float(audio.getframerate())
+        self.latency = latency
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def listen(self, timeout=VOICE_TIMEOUT, silence=VOICE_SILENCE):
+        with self._lock:
+            transcript = self.transcripts[self._next % len(self.transcripts)] if self.transcripts else ""
+            self._next += 1
+        if not transcript or self.latency >= timeout:
+            time.sleep(timeout)
+            return ""
+        time.sleep(self.latency + silence)
+        return transcript
+
+
+recognizer = None
+_recognizer_lock = threading.Lock()
+
+def GetRecognizer():
+    """Returns the shared Recognizer (VoiceInputFile in .env selects the offline stand-in)."""
+    global recognizer
+    with _recognizer_lock:
+        if recognizer is None:
+            path = env_vars.get("VoiceInputFile", "")
+            recognizer = FileRecognizer(path) if path else BrowserSessionPool(
+                size=int(env_vars.get("VoiceSessions", 2)),
+                lease_timeout=float(env_vars.get("VoiceLeaseTimeout", 5)),
+            )
+        return recognizer
+
+def SetRecognizer(new_recognizer):
+    """Replaces the shared Recognizer (e.g. with a FileRecognizer for offline runs)."""
+    global recognizer
+    with _recognizer_lock:
+        recognizer = new_recognizer
+
+def Warmup():
+    """Launches the browser sessions ahead of the first voice request."""
+    GetRecognizer().warmup()
 
 # --- FUNCTIONS ---
 def SetAssistantStatus(Status):
@@ -80,28 +366,29 @@ def QueryModifier(Query):
     # ... (rest of the function remains the same)
     return new_query.capitalize()
 
+# Voice queries already in English skip translation; repeated phrases come from the cache
+translator = Translator(maxsize=int(env_vars.get("TranslationCacheSize", 512)))
+
 def UniversalTranslator(Text):
     """Translates text into English."""
-    return mt.translate(Text, "en", "auto").capitalize()
+    return translator.translate(Text).capitalize()
 
-def SpeechRecognition():
-    """Performs speech recognition using the webdriver."""
-    driver.get("file:///" + VOICE_HTML_PATH)
-    driver.find_element(by=By.ID, value="start").click()
-    while True:
-        try:
-            Text = driver.find_element(by=By.ID, value="output").text
-            if Text:
-                driver.find_element(by=By.ID, value="end").click()
-                if InputLanguage and "en" in InputLanguage.lower():
-                    return QueryModifier(Text)
-                else:
-                    SetAssistantStatus("Translating...")
-                    return QueryModifier(UniversalTranslator(Text))
-        except Exception:
-            pass
+def SpeechRecognition(timeout=VOICE_TIMEOUT, on_status=None):
+    """Listens for one utterance and returns it as an English query ("" if nothing was heard).
+    `on_status(text)` is told about slow steps, e.g. the web app's per-session set_status."""
+    Text = GetRecognizer().listen(timeout, VOICE_SILENCE)
+    if not Text:
+        return ""
+    if InputLanguage and "en" in InputLanguage.lower():
+        return QueryModifier(Text)
+    else:
+        # The translation runs on the translator's pool while the status is updated
+        translation = translator.submit(Text)
+        if not translation.done() and on_status is not None:
+            on_status("Translating...")
+        return QueryModifier(translation.result().capitalize())
 
 if __name__ == "__main__":
     while True:
-        Text = SpeechRecognition()
+        Text = SpeechRecognition(on_status=print)
         print(Text)
\ No newline at end of file
@@ -0,0 +1,80 @@
+import importlib
+import threading
+import time
+
+# --- LAZY SUBSYSTEMS ---
+# Backend modules are imported on first attribute access. A module may define
+# Warmup() to pay its one-off initialisation cost (clients, browsers) ahead of time.
+
+
+class LazySubsystem:
+    """Proxy that imports a Backend module on first use and records its startup cost."""
+
+    def __init__(self, module_name):
+        self.name = module_name
+        self.import_seconds = None
+        self.warmup_seconds = None
+        self.error = None
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def load(self):
+        """Imports the module (once) and returns it."""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self.name)
+                    self.import_seconds = time.perf_counter() - start
+                    self._module = module
+        return self._module
+
+    def warmup(self):
+        """Imports the module and runs its Warmup() hook, if any."""
+        module = self.load()
+        hook = getattr(module, "Warmup", None)
+        if hook is not None and self.warmup_seconds is None:
+            start = time.perf_counter()
+            hook()
+            self.warmup_seconds = time.perf_counter() - start
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+def WarmUp(subsystems, background=True):
+    """Warms the given subsystems in order, on a daemon thread unless background=False."""
+    def run():
+        for subsystem in subsystems:
+            try:
+                subsystem.warmup()
+            except Exception as e:
+                subsystem.error = str(e)
+                print(f"[WARN] Warm-up of {subsystem.name} failed: {e}")
+
+    if background:
+        thread = threading.Thread(target=run, name="warmup", daemon=True)
+        thread.start()
+        return thread
+    run()
+
+
+def StartupReport(subsystems):
+    """Formats the import/warm-up cost of each subsystem as a table."""
+    def fmt(seconds):
+        return "-" if seconds is None else f"{seconds * 1000:9.1f} ms"
+
+    lines = [f"{'Subsystem':<24}{'Import':>12}{'Warm-up':>12}{'Total':>12}"]
+    total = 0.0
+    for s in subsystems:
+        cost = (s.import_seconds or 0.0) + (s.warmup_seconds or 0.0)
+        total += cost
+        status = f"  ERROR: {s.error}" if s.error else ""
+        lines.append(f"{s.name:<24}{fmt(s.import_seconds):>12}{fmt(s.warmup_seconds):>12}{fmt(cost):>12}{status}")
+    lines.append(f"{'TOTAL':<24}{'':>12}{'':>12}{fmt(total):>12}")
+    return "\n".join(lines)
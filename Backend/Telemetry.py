@@ -0,0 +1,268 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- METRICS AND TRACING ---
+# Stages time themselves with `with Span("classify"):`. Every finished span is
+# observed in the sara_span_seconds histogram and, when it belongs to a trace
+# (one per query), kept with its trace so that a slow turn can be looked up by
+# the trace/span ids stored on its chat messages. Metrics are rendered in the
+# Prometheus text format; subsystems that already keep their own counters
+# (caches, pools, LLM usage) are exported through collector callbacks.
+
+# Histogram buckets in seconds, from cache hits up to slow image jobs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+MAX_TRACES = 256
+MAX_SPANS_PER_TRACE = 200
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self.labelnames, key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        out = []
+        for key, values in sorted(series.items()):
+            for bound, count in zip(self.buckets, values):
+                out.append((self.name + "_bucket", self.labelnames, key, (("le", _format_value(float(bound))),), count))
+            out.append((self.name + "_bucket", self.labelnames, key, (("le", "+Inf"),), values[-1]))
+            out.append((self.name + "_sum", self.labelnames, key, (), values[-2]))
+            out.append((self.name + "_count", self.labelnames, key, (), values[-1]))
+        return out
+
+
+class Collected:
+    """Metric whose samples come from a callback at scrape time: fn() -> [(labels dict, value)]."""
+
+    def __init__(self, name, description, kind, fn):
+        self.name = name
+        self.description = description
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self):
+        out = []
+        for labels, value in self.fn():
+            names = tuple(labels)
+            out.append((self.name, names, tuple(str(labels[n]) for n in names), (), value))
+        return out
+
+
+class Registry:
+    """Named metrics rendered together in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, description, labelnames=()):
+        return self.register(Counter(name, description, labelnames))
+
+    def histogram(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, description, labelnames, buckets))
+
+    def collect(self, name, description, kind, fn):
+        """Registers a callback metric (kind 'counter' or 'gauge')."""
+        return self.register(Collected(name, description, kind, fn))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:  # A broken collector must not take the whole scrape down
+                print(f"[WARN] metric {metric.name} failed: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labelnames, values, extra, value in samples:
+                lines.append(f"{name}{_format_labels(labelnames, values, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+SPAN_SECONDS = REGISTRY.histogram("sara_span_seconds", "Duration of traced pipeline stages.", ("span",))
+ERRORS = REGISTRY.counter("sara_errors_total", "Failures per pipeline stage.", ("span",))
+LLM_TTFT_SECONDS = REGISTRY.histogram("sara_llm_ttft_seconds", "LLM time to first token.", ("provider", "model"))
+LLM_SECONDS = REGISTRY.histogram("sara_llm_seconds", "LLM request time until the last token.", ("provider", "model"))
+
+REGISTRY.collect("sara_active_threads", "Live Python threads in this process.", "gauge",
+                 lambda: [({}, threading.active_count())])
+
+
+def RecordError(stage):
+    """Counts a failure that was handled without leaving a span."""
+    ERRORS.inc(span=stage)
+
+
+# --- TRACING ---
+
+_context = threading.local()
+_traces = OrderedDict()  # trace id -> list of finished span dicts
+_traces_lock = threading.Lock()
+_span_ids = itertools.count(1)
+_process_tag = f"{os.getpid():x}"
+
+
+def _stack():
+    stack = getattr(_context, "stack", None)
+    if stack is None:
+        stack = _context.stack = []
+    return stack
+
+
+def _finish(record):
+    with _traces_lock:
+        spans = _traces.get(record["trace"])
+        if spans is not None and len(spans) < MAX_SPANS_PER_TRACE:
+            spans.append(record)
+
+
+class Span:
+    """Times a block as a pipeline stage; nested spans in the same thread become children.
+    `new_trace=True` starts a trace (one per query) when none is active."""
+
+    def __init__(self, name, new_trace=False, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.new_trace = new_trace
+        self.span_id = f"{_process_tag}-{next(_span_ids):x}"
+        self.trace_id = None
+        self.parent_id = None
+
+    def __enter__(self):
+        stack = _stack()
+        parent = stack[-1] if stack else None
+        if parent is not None:
+            self.trace_id, self.parent_id = parent.trace_id, parent.span_id
+        elif self.new_trace:
+            self.trace_id = self.span_id
+            with _traces_lock:
+                _traces[self.trace_id] = []
+                while len(_traces) > MAX_TRACES:
+                    _traces.popitem(last=False)
+        stack.append(self)
+        self.start_wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        _stack().pop()
+        SPAN_SECONDS.observe(seconds, span=self.name)
+        if exc_type is not None:
+            ERRORS.inc(span=self.name)
+        if self.trace_id is not None:
+            _finish({"name": self.name, "trace": self.trace_id, "span": self.span_id, "parent": self.parent_id,
+                     "start": self.start_wall, "seconds": seconds,
+                     "error": None if exc is None else str(exc), **self.attrs})
+        return False
+
+
+def RecordSpan(name, seconds, error=None, **attrs):
+    """Records an already-timed stage (e.g. a streamed LLM call) as a child of the current span."""
+    SPAN_SECONDS.observe(seconds, span=name)
+    if error is not None:
+        ERRORS.inc(span=name)
+    stack = _stack()
+    if stack and stack[-1].trace_id is not None:
+        parent = stack[-1]
+        _finish({"name": name, "trace": parent.trace_id, "span": f"{_process_tag}-{next(_span_ids):x}",
+                 "parent": parent.span_id, "start": time.time() - seconds, "seconds": seconds,
+                 "error": error, **attrs})
+
+
+def CurrentSpan():
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def Bind(fn):
+    """Wraps `fn` so that, run on another thread, its spans join the caller's current trace."""
+    parent = CurrentSpan()
+    if parent is None:
+        return fn
+
+    def bound(*args, **kwargs):
+        saved = getattr(_context, "stack", None)
+        _context.stack = [parent]
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _context.stack = saved
+    return bound
+
+
+def GetTrace(trace_id):
+    """Finished spans of a recent trace, in completion order (None if unknown or evicted)."""
+    with _traces_lock:
+        spans = _traces.get(trace_id)
+        return None if spans is None else list(spans)
@@ -2,92 +2,451 @@ import pygame
 import random
 import asyncio
 import edge_tts
+import io
+import itertools
+import queue
+import re
+import threading
 import os
-from dotenv import dotenv_values
+import time
+from Config import env_vars
+from Telemetry import Span, RecordSpan, Bind
+from AudioCache import AudioCache, AudioKey
 
-# Load environment variables from a .env file
-env_vars = dotenv_values(".env")
+# Voice configuration from the shared .env loader
 AssistantVoice = env_vars.get("AssistantVoice")
+VoicePitch = '+5Hz'
+VoiceRate = '+13%'
 
-# Asynchronous function to convert text to an audio file
-async def TextToAudioFile(text) -> None:
-    file_path = r"Data\speech.mp3"  # Define the path where the speech file will be saved
+# Long answers are cut to this many sentences, followed by one of the responses below
+MAX_SPOKEN_SENTENCES = 20
 
-    if os.path.exists(file_path):  # Check if the file already exists
-        os.remove(file_path)  # If exists, remove it to avoid overwriting errors
+# A failed utterance is retried this many times in total, waiting 0.5 s, 1 s, ... in between
+TTS_ATTEMPTS = 3
+TTS_RETRY_DELAY = 0.5
 
-    # Create the communication object to generate speech
-    communicate = edge_tts.Communicate(text, AssistantVoice, pitch='+5Hz', rate='+13%')
-    await communicate.save(r'Data\speech.mp3')  # Save the generated speech as an MP3 file
+# List of predefined responses for cases where the text is too long
+responses = [
+    "The rest of the result has been printed to the chat screen, kindly check it out sir.",
+    "The rest of the text is now on the chat screen, sir, please check it.",
+    "You can see the rest of the text on the chat screen, sir.",
+    "The remaining part of the text is now on the chat screen, sir.",
+    "Sir, you'll find more text on the chat screen for you to see.",
+    "The rest of the answer is now on the chat screen, sir.",
+    "Sir, please look at the chat screen, the rest of the answer is there.",
+    "You'll find the complete answer on the chat screen, sir.",
+    "The next part of the text is on the chat screen, sir.",
+    "Sir, please check the chat screen for more information.",
+    "There's more text on the chat screen for you, sir.",
+    "Sir, take a look at the chat screen for additional text.",
+    "You'll find more to read on the chat screen, sir.",
+    "Sir, check the chat screen for the rest of the text.",
+    "The chat screen has the rest of the text, sir.",
+    "There's more to see on the chat screen, sir, please look.",
+    "Sir, the chat screen holds the continuation of the text.",
+    "You'll find the complete answer on the chat screen, kindly check it out sir.",
+    "Please review the chat screen for the rest of the text, sir.",
+    "Sir, look at the chat screen for the complete answer."
+]
 
-# Function to manage Text to Speech (TTS) functionality
-def TTS(Text, func=lambda r=None: True):
-    while True:
+# --- SYNTHESIS AND PLAYBACK (IN MEMORY) ---
+
+# Asynchronous function to synthesize text into MP3 bytes
+async def SynthesizeAsync(text) -> bytes:
+    communicate = edge_tts.Communicate(text, AssistantVoice, pitch=VoicePitch, rate=VoiceRate)
+    audio = bytearray()
+    async for chunk in communicate.stream():  # Collect the audio chunks instead of saving a file
+        if chunk["type"] == "audio":
+            audio.extend(chunk["data"])
+    return bytes(audio)
+
+# Synthesized clips are kept on disk, so repeated utterances skip edge_tts (AudioCacheMB=0 disables it)
+audio_cache = None
+if float(env_vars.get("AudioCacheMB", 64)) > 0:
+    audio_cache = AudioCache(
+        path=env_vars.get("AudioCacheDir", os.path.join("Data", "AudioCache")),
+        max_bytes=int(float(env_vars.get("AudioCacheMB", 64)) * (1 << 20)),
+    )
+
+def Synthesize(text) -> bytes:
+    """Synthesizes `text` to MP3 bytes, reusing a cached clip when the same text was spoken before."""
+    def synthesize():
+        with Span("tts.synthesis", chars=len(text)):
+            return asyncio.run(SynthesizeAsync(text))
+
+    if audio_cache is None:
+        return synthesize()
+    return audio_cache.get_or_synthesize(AudioKey(text, AssistantVoice, VoicePitch, VoiceRate), synthesize)
+
+def PrewarmAudio(phrases=()):
+    """Synthesizes the canned responses (plus `phrases`) that aren't cached yet."""
+    if audio_cache is None:
+        return
+    for phrase in list(responses) + list(phrases):
+        if not audio_cache.contains(AudioKey(phrase, AssistantVoice, VoicePitch, VoiceRate)):
+            try:
+                Synthesize(phrase)
+            except Exception as e:
+                print(f"Could not pre-synthesize '{phrase}': {e}")
+
+def PlayAudio(audio, func=lambda r=None: True):
+    """Plays MP3 bytes from memory; returns False if `func()` asked to stop early."""
+    with Span("tts.playback"):
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()  # Initialized once and kept open between clips
+        pygame.mixer.music.load(io.BytesIO(audio), "mp3")
+        pygame.mixer.music.play()  # Play the audio
+
+        # Loop until the audio is done playing or the function stops
+        while pygame.mixer.music.get_busy():
+            if func() == False:
+                pygame.mixer.music.stop()
+                return False
+            pygame.time.Clock().tick(10)
+        return True
+
+# --- PLAYBACK ENGINE ---
+# All speech goes through one long-lived worker thread that owns the mixer. Callers
+# queue Utterances (a sequence of clips spoken back to back) with a priority; the
+# most urgent waiting utterance plays next, and Interrupt() (barge-in) silences the
+# current clip and drops everything queued or still being prepared. Answers of one
+# query that are synthesized concurrently carry a place in a SpeechSequence and are
+# held back until every earlier place has played or been given up, so they are
+# heard in task order whichever is ready first.
+
+PRIORITY_URGENT = 0  # Errors and prompts that must be heard next
+PRIORITY_ANSWER = 1  # Answers to the user's question
+PRIORITY_NOTICE = 2  # Confirmations ("Executing your command: ...")
+
+class SpeechSequence:
+    """Places 0, 1, 2, ... of the utterances of one query, played strictly in that order."""
+
+    def __init__(self):
+        self.next = 0  # The place allowed to play now
+        self.finished = set()  # Later places that are already done
+        self.claimed = set()  # Places taken by an Utterance, which gives them up when it finishes
+
+class Utterance:
+    """Clips spoken back to back. `clips` may be any iterable, e.g. a generator fed by synthesis.
+    With a `sequence`, the utterance plays only once places before `place` are done."""
+
+    def __init__(self, engine, clips, priority=PRIORITY_ANSWER, func=lambda r=None: True, on_start=None,
+                 sequence=None, place=0):
+        self.engine = engine
+        self.clips = clips
+        self.priority = priority
+        self.func = func
+        self.on_start = on_start
+        self.sequence = sequence
+        self.place = place
+        if sequence is not None:
+            sequence.claimed.add(place)
+        self.generation = engine.generation  # Interrupt() cancels every utterance created before it
+        self.started_at = None
+        self._cancelled = False
+        self._done = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled or self.generation < self.engine.generation
+
+    def cancel(self):
+        self._cancelled = True
+
+    def wait(self, timeout=None):
+        """Blocks until the utterance has played or been dropped; True if it finished in time."""
+        return self._done.wait(timeout)
+
+    def keep_playing(self, r=None):
+        return not self.cancelled and self.func(r) != False
+
+    def finish(self):
+        if self._done.is_set():
+            return
         try:
-            # Convert text to an audio file async
-            asyncio.run(TextToAudioFile(Text))
+            # Call the provided function with False to signal the end of TTS
+            self.func(False)
+        except Exception as e:
+            print(f"Error in finally block: {e}")
+        self._done.set()
+        if self.sequence is not None:
+            self.engine._advance(self.sequence, self.place)
+
+class PlaybackEngine:
+    """Single playback worker with a priority queue of Utterances and barge-in."""
 
-            # Initialize pygame mixer for audio playback
-            pygame.mixer.init()
+    def __init__(self):
+        self.generation = 0
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()  # FIFO within a priority level
+        self._current = None
+        self._thread = None
+        self._held = []  # Submitted utterances waiting for an earlier place in their sequence
+        self._lock = threading.Lock()
+        self.stats = {"played": 0, "interrupted": 0, "dropped": 0}
+
+    def utterance(self, clips, priority=PRIORITY_ANSWER, func=lambda r=None: True, on_start=None,
+                  sequence=None, place=0):
+        """Creates an Utterance to submit() later; it is still cancelled by an Interrupt() in between."""
+        return Utterance(self, clips, priority, func, on_start, sequence, place)
+
+    def submit(self, utterance):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tts-playback", daemon=True)
+                self._thread.start()
+            if utterance.sequence is not None and utterance.place != utterance.sequence.next:
+                self._held.append(utterance)
+                return utterance
+            self._queue.put((utterance.priority, next(self._order), utterance))
+        return utterance
+
+    def skip(self, sequence, place):
+        """Gives up a place that will not be spoken; a no-op if an Utterance has claimed it."""
+        if place not in sequence.claimed:
+            self._advance(sequence, place)
+
+    def _advance(self, sequence, place):
+        # Marks a place done and queues the held utterance whose turn has come
+        with self._lock:
+            if place < sequence.next:
+                return
+            sequence.finished.add(place)
+            while sequence.next in sequence.finished:
+                sequence.finished.discard(sequence.next)
+                sequence.next += 1
+            ready = [u for u in self._held if u.sequence is sequence and u.place == sequence.next]
+            for utterance in ready:
+                self._held.remove(utterance)
+                self._queue.put((utterance.priority, next(self._order), utterance))
+
+    def play(self, clips, priority=PRIORITY_ANSWER, func=lambda r=None: True):
+        """Queues clips for playback and returns their Utterance."""
+        return self.submit(self.utterance(clips, priority, func))
+
+    def interrupt(self):
+        """Barge-in: stops the clip that is playing and drops queued and in-preparation speech."""
+        with self._lock:
+            self.generation += 1
+            if self._current is not None:
+                self.stats["interrupted"] += 1
+            held, self._held = self._held, []
+        for utterance in held:
+            self.stats["dropped"] += 1
+            utterance.finish()
+        while True:
+            try:
+                _, _, utterance = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self.stats["dropped"] += 1
+            utterance.finish()
+            self._queue.task_done()
 
-            # Load the generated speech file into pygame mixer
-            pygame.mixer.music.load(r"Data\speech.mp3")
-            pygame.mixer.music.play()  # Play the audio
+    def drain(self):
+        """Blocks until every queued utterance has played or been dropped."""
+        self._queue.join()
 
-            # Loop until the audio is done playing or the function stops
-            while pygame.mixer.music.get_busy():
-                if func() == False:
-                    break
-                pygame.time.Clock().tick(10)
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, queued=self._queue.qsize() + len(self._held), playing=self._current is not None)
 
+    def _run(self):
+        while True:
+            _, _, utterance = self._queue.get()
+            if utterance.cancelled:
+                self.stats["dropped"] += 1
+                utterance.finish()
+                self._queue.task_done()
+                continue
+            with self._lock:
+                self._current = utterance
+            try:
+                for audio in utterance.clips:
+                    if utterance.cancelled:
+                        break
+                    if utterance.started_at is None:
+                        utterance.started_at = time.perf_counter()
+                        if utterance.on_start is not None:
+                            utterance.on_start(utterance)
+                    try:
+                        if PlayAudio(audio, utterance.keep_playing) == False:
+                            break
+                    except Exception as e:
+                        print(f"Error in TTS: {e}")
+                self.stats["played"] += 1
+            except Exception as e:
+                print(f"Error in TTS: {e}")
+            finally:
+                with self._lock:
+                    self._current = None
+                utterance.finish()
+                self._queue.task_done()
+
+player = PlaybackEngine()
+
+def Interrupt():
+    """Barge-in: silences the assistant (e.g. when the user starts speaking)."""
+    player.interrupt()
+
+# Function to manage Text to Speech (TTS) functionality; `Text` may be a list of clips spoken back to back
+def TTS(Text, func=lambda r=None: True, priority=PRIORITY_ANSWER, wait=True):
+    """Synthesizes `Text` (a string or list of clips) and queues it on the playback engine;
+    with wait=True blocks until it has played. Gives up after TTS_ATTEMPTS failures."""
+    parts = Text if isinstance(Text, list) else [Text]
+    for attempt in range(TTS_ATTEMPTS):
+        try:
+            utterance = player.utterance([], priority, func)
+            utterance.clips = [Synthesize(part) for part in parts]
+            player.submit(utterance)
+            if wait:
+                utterance.wait()
             return True
-        
-        except Exception as e:  # Handle any exceptions during the process
-            print(f"Error in TTS: {e}")
 
-        finally:
+        except Exception as e:  # Handle any exceptions during the process
+            print(f"Error in TTS (attempt {attempt + 1} of {TTS_ATTEMPTS}): {e}")
             try:
                 # Call the provided function with False to signal the end of TTS
                 func(False)
-                pygame.mixer.music.stop()
-                pygame.mixer.quit()
 
             except Exception as e:
                 print(f"Error in finally block: {e}")
+            if attempt + 1 < TTS_ATTEMPTS:
+                time.sleep(TTS_RETRY_DELAY * 2 ** attempt)
+    return False
 
 # Function to manage Text to Speech with additional responses for long text
-def TextToSpeech(Text, func=lambda r=None: True):
+def TextToSpeech(Text, func=lambda r=None: True, priority=PRIORITY_ANSWER, wait=True):
     Data = str(Text).split(".")
 
-    # List of predefined responses for cases where the text is too long
-    responses = [
-        "The rest of the result has been printed to the chat screen, kindly check it out sir.",
-        "The rest of the text is now on the chat screen, sir, please check it.",
-        "You can see the rest of the text on the chat screen, sir.",
-        "The remaining part of the text is now on the chat screen, sir.",
-        "Sir, you'll find more text on the chat screen for you to see.",
-        "The rest of the answer is now on the chat screen, sir.",
-        "Sir, please look at the chat screen, the rest of the answer is there.",
-        "You'll find the complete answer on the chat screen, sir.",
-        "The next part of the text is on the chat screen, sir.",
-        "Sir, please check the chat screen for more information.",
-        "There's more text on the chat screen for you, sir.",
-        "Sir, take a look at the chat screen for additional text.",
-        "You'll find more to read on the chat screen, sir.",
-        "Sir, check the chat screen for the rest of the text.",
-        "The chat screen has the rest of the text, sir.",
-        "There's more to see on the chat screen, sir, please look.",
-        "Sir, the chat screen holds the continuation of the text.",
-        "You'll find the complete answer on the chat screen, kindly check it out sir.",
-        "Please review the chat screen for the rest of the text, sir.",
-        "Sir, look at the chat screen for the complete answer."
-    ]
-
     # If the text is very long (more than 4 sentences and 250 words), add a response message
+    # (spoken as its own clip so its cached audio is reused)
     if len(Data) > 4 and len(Text) >= 2500:
-        TTS(" ".join(Text.split(".")[0:20]) + ". " + random.choice(responses), func)
-    else:
-        TTS(Text, func)
+        return TTS([" ".join(Text.split(".")[0:MAX_SPOKEN_SENTENCES]) + ".", random.choice(responses)],
+                   func, priority, wait)
+    return TTS(Text, func, priority, wait)
+
+# --- SENTENCE-PIPELINED SPEECH FOR STREAMING ANSWERS ---
+# A SpeechPipeline is fed the answer as the LLM streams it. Complete sentences are
+# synthesized on one thread and played on another, so sentence N+1 is synthesized
+# while sentence N is playing and the first words are heard long before the answer
+# is complete.
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n+")
+
+class SentenceSplitter:
+    """Cuts streamed text into sentences; fragments shorter than `min_chars` are merged forward."""
+
+    def __init__(self, min_chars=24):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text):
+        """Adds streamed text and returns the sentences it completed."""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END_RE.finditer(self._buffer):
+            candidate = self._buffer[start:match.start()].strip()
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Returns whatever text is left once the stream has ended."""
+        rest, self._buffer = self._buffer.strip(), ""
+        return rest
+
+class SpeechPipeline:
+    """Speaks a streaming answer sentence by sentence. Call feed() with each delta and
+    close() at the end; `time_to_first_audio` is set once the first clip starts playing.
+    The answer is queued on the playback engine as one Utterance when its first clip is ready
+    (and, with a `sequence`, plays after the answers at earlier places)."""
+
+    def __init__(self, func=lambda r=None: True, max_sentences=MAX_SPOKEN_SENTENCES, priority=PRIORITY_ANSWER,
+                 sequence=None, place=0):
+        self.max_sentences = max_sentences
+        self.started = time.perf_counter()
+        self.time_to_first_audio = None
+        self.spoken = 0  # Sentences queued for speech
+        self.truncated = False
+        self._splitter = SentenceSplitter()
+        self._sentences = queue.Queue()
+        self._clips = queue.Queue()
+        self._utterance = player.utterance(self._stream_clips(), priority, func, on_start=self._first_audio,
+                                           sequence=sequence, place=place)
+        self._synthesizer = threading.Thread(target=Bind(self._synthesize), name="tts-synth", daemon=True)
+        self._synthesizer.start()
+
+    def feed(self, text):
+        for sentence in self._splitter.feed(text):
+            self._queue(sentence)
+
+    def close(self, fallback=None):
+        """Ends the stream. If nothing was spoken, `fallback` (e.g. an error message) is spoken instead."""
+        rest = self._splitter.flush()
+        if rest:
+            self._queue(rest)
+        if self.spoken == 0 and fallback:
+            self._queue(fallback)
+        if self.truncated:
+            self._sentences.put(random.choice(responses))
+        self._sentences.put(None)
+
+    def cancel(self):
+        """Stops speaking immediately and drops queued sentences."""
+        self._utterance.cancel()
+        self._sentences.put(None)
+
+    def wait(self, timeout=None):
+        """Blocks until the last clip has played; True if it finished in time."""
+        self._synthesizer.join(timeout)
+        return self._utterance.wait(0 if self._synthesizer.is_alive() else timeout)
+
+    def _queue(self, sentence):
+        if self.spoken >= self.max_sentences:
+            self.truncated = True
+            return
+        self.spoken += 1
+        self._sentences.put(sentence)
+
+    def _synthesize(self):
+        submitted = False
+        while not self._utterance.cancelled:
+            sentence = self._sentences.get()
+            if sentence is None:
+                break
+            try:
+                self._clips.put(Synthesize(sentence))
+            except Exception as e:
+                print(f"Error in TTS: {e}")
+                continue
+            if not submitted:
+                # The playback engine is only claimed once there is something to say
+                player.submit(self._utterance)
+                submitted = True
+        self._clips.put(None)
+        if not submitted:
+            self._utterance.finish()
+
+    def _stream_clips(self):
+        # Polls so that a barge-in is noticed while the next sentence is still being written
+        while True:
+            try:
+                audio = self._clips.get(timeout=0.1)
+            except queue.Empty:
+                if self._utterance.cancelled:
+                    return
+                continue
+            if audio is None:
+                return
+            yield audio
+
+    def _first_audio(self, utterance):
+        self.time_to_first_audio = utterance.started_at - self.started
+        RecordSpan("tts.first_audio", self.time_to_first_audio)
 
 # Main execution loop
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from Telemetry import Span
+
+# --- TRANSLATION OF VOICE QUERIES ---
+# Voice queries in a non-English InputLanguage are translated to English before
+# classification. Many of them are English anyway (commands, names), so a local
+# language check scores each word against common English words and character
+# trigrams and skips the network round trip when the text already reads as English.
+# Translations are cached (LRU), identical requests in flight share one call, and
+# calls run on a small thread pool so the caller can do other work meanwhile.
+# Misjudging English as foreign only costs a translation, so the check is strict.
+
+_ENGLISH_SAMPLE = """
+what is the weather like today and will it rain tomorrow in the city
+open chrome and play some music on youtube please
+can you tell me about the latest news in technology and science
+who is the prime minister of india and what did he say yesterday
+how do i make a cup of tea with milk and sugar
+set a reminder for my meeting at five in the evening
+write an application for leave and open it in notepad
+generate an image of a lion standing on a mountain at sunset
+close the browser and turn up the volume of the system
+thank you very much that was really helpful for me
+the quick brown fox jumps over the lazy dog while the children are playing outside
+there are many things that people should know about their health and their work
+this is one of the most important questions that we have been asked in a long time
+she would have been there if they had told her when it was going to happen
+search for the best restaurants near me that are open right now
+explain how computers work and why they need memory and a processor
+please give me a short summary of the history of the united kingdom
+good morning how are you doing i hope everything is going well with your family
+"""
+
+_WORD_RE = re.compile(r"[a-z']+")
+
+
+def _words(text):
+    return _WORD_RE.findall(text.lower())
+
+
+def _trigrams(word):
+    padded = f" {word} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+ENGLISH_WORDS = frozenset(_words(_ENGLISH_SAMPLE))
+ENGLISH_TRIGRAMS = frozenset(gram for word in ENGLISH_WORDS for gram in _trigrams(word))
+ENGLISH_THRESHOLD = 0.6
+SHORT_ENGLISH_THRESHOLD = 0.8  # One- and two-word inputs give the trigram score little to go on
+
+
+def EnglishScore(text):
+    """0..1: how English the text reads. Known words score 1, others the share of their
+    trigrams seen in English; non-Latin script scores 0."""
+    letters = [c for c in text if c.isalpha()]
+    if not letters:
+        return 1.0
+    if sum(c.isascii() for c in letters) < 0.9 * len(letters):
+        return 0.0
+    words = _words(text)
+    if len(words) >= 2 and not any(len(word) > 1 and word in ENGLISH_WORDS for word in words):
+        return 0.0  # English phrases practically always contain a common word ("a" alone doesn't count)
+    scores = [1.0 if word in ENGLISH_WORDS else
+              sum(gram in ENGLISH_TRIGRAMS for gram in _trigrams(word)) / len(_trigrams(word))
+              for word in words]
+    return sum(scores) / len(scores)
+
+
+def IsEnglish(text, threshold=ENGLISH_THRESHOLD):
+    if len(_words(text)) < 3:
+        threshold = max(threshold, SHORT_ENGLISH_THRESHOLD)
+    return EnglishScore(text) >= threshold
+
+
+def NormalizeText(text):
+    """Folds case and whitespace."""
+    return " ".join(text.lower().split())
+
+
+def MTranslate(text, target="en"):
+    """Google Translate through the mtranslate package."""
+    import mtranslate as mt
+    return mt.translate(text, target, "auto")
+
+
+class Translator:
+    """Translation to English with an English short-circuit, an LRU cache and in-flight coalescing."""
+
+    def __init__(self, maxsize=512, workers=2, translate=MTranslate):
+        self.maxsize = maxsize
+        self.translate_fn = translate
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="translate")
+        self._entries = OrderedDict()  # normalized text -> translation
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {"skipped": 0, "hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+
+    def submit(self, text):
+        """Returns a Future of the English text; it is already resolved when no call is needed."""
+        future = Future()
+        if IsEnglish(text):
+            with self._lock:
+                self.stats["skipped"] += 1
+            future.set_result(text)
+            return future
+        key = NormalizeText(text)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                future.set_result(self._entries[key])
+                return future
+            if key in self._in_flight:
+                self.stats["coalesced"] += 1
+                return self._in_flight[key]
+            self.stats["misses"] += 1
+            self._in_flight[key] = future
+        self._pool.submit(self._run, key, text, future)
+        return future
+
+    def translate(self, text):
+        return self.submit(text).result()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries))
+
+    def _run(self, key, text, future):
+        try:
+            with Span("translate", chars=len(text)):
+                result = self.translate_fn(text)
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+                del self._in_flight[key]
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._entries[key] = result
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            del self._in_flight[key]
+        future.set_result(result)
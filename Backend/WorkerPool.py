@@ -0,0 +1,77 @@
+import heapq
+import itertools
+import threading
+
+# --- PRIORITIES ---
+# Lower numbers run first; jobs of equal priority run in submission order.
+PRIORITY_VOICE = 0
+PRIORITY_TEXT = 1
+
+
+class QueueFull(Exception):
+    """Raised by WorkerPool.submit() when the pending queue is at capacity."""
+
+    def __init__(self, depth):
+        super().__init__(f"Worker queue is full ({depth} pending).")
+        self.depth = depth
+
+
+class WorkerPool:
+    """Fixed number of worker threads draining a bounded priority queue."""
+
+    def __init__(self, workers=4, max_queue=32, name="worker"):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True).start()
+
+    def submit(self, fn, *args, priority=PRIORITY_TEXT):
+        """Queues fn(*args) and returns its 1-based position in the queue, or raises QueueFull."""
+        with self._cond:
+            if len(self._heap) >= self.max_queue:
+                self._rejected += 1
+                raise QueueFull(len(self._heap))
+            entry = (priority, next(self._seq), fn, args)
+            heapq.heappush(self._heap, entry)
+            position = sum(1 for queued in self._heap if queued[:2] <= entry[:2])
+            self._cond.notify()
+        return position
+
+    def stats(self):
+        """Returns a snapshot of queue depth (total and per priority) and worker usage."""
+        with self._cond:
+            by_priority = {}
+            for priority, *_ in self._heap:
+                by_priority[priority] = by_priority.get(priority, 0) + 1
+            return {
+                "workers": self.workers,
+                "active": self._active,
+                "queue_depth": len(self._heap),
+                "queue_capacity": self.max_queue,
+                "queue_by_priority": by_priority,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, fn, args = heapq.heappop(self._heap)
+                self._active += 1
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"[ERROR] worker job {getattr(fn, '__name__', fn)}: {e}")
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._completed += 1
+
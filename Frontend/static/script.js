@@ -5,7 +5,12 @@ document.addEventListener('DOMContentLoaded', () => {
     const micButton = document.getElementById('mic-button');
     const statusBar = document.getElementById('status-bar');
 
-    let lastMessageCount = 0;
+    // Cursor into the server's chat history and the ETag of the last /updates response
+    let nextIndex = 0;
+    let lastETag = null;
+
+    // In-progress streamed answers, keyed by stream id
+    const partials = new Map();
 
     // Function to add a message to the chat window
     const addMessage = (sender, text) => {
@@ -14,6 +19,41 @@ document.addEventListener('DOMContentLoaded', () => {
         messageDiv.textContent = text;
         chatWindow.appendChild(messageDiv);
         chatWindow.scrollTop = chatWindow.scrollHeight; // Auto-scroll to the bottom
+        return messageDiv;
+    };
+
+    // Poll an image generation job and show its images under the message once done
+    const watchImageJob = async (jobId, messageDiv) => {
+        try {
+            const response = await fetch(`/images/${jobId}`);
+            if (!response.ok) {
+                return;
+            }
+            const job = await response.json();
+            if (job.status === 'pending' || job.status === 'running') {
+                setTimeout(() => watchImageJob(jobId, messageDiv), 2000);
+                return;
+            }
+            if (job.status === 'done') {
+                const gallery = document.createElement('div');
+                gallery.classList.add('message-images');
+                // Small thumbnails in the chat; each links to the full-resolution image
+                job.images.forEach((url, i) => {
+                    const link = document.createElement('a');
+                    link.href = url;
+                    link.target = '_blank';
+                    const img = document.createElement('img');
+                    img.src = job.thumbnails ? job.thumbnails[i] : url;
+                    img.loading = 'lazy';
+                    link.appendChild(img);
+                    gallery.appendChild(link);
+                });
+                messageDiv.appendChild(gallery);
+                chatWindow.scrollTop = chatWindow.scrollHeight;
+            }
+        } catch (error) {
+            console.error('Image job polling error:', error);
+        }
     };
 
     // Function to send a text query
@@ -22,11 +62,20 @@ document.addEventListener('DOMContentLoaded', () => {
         if (query) {
             textInput.value = '';
             // No need to add the message here, the poller will get it from the backend
-            await fetch('/query', {
+            const response = await fetch('/query', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ query: query }),
             });
+            if (response.status === 429) {
+                textInput.value = query; // Keep the query so the user can resend it
+                statusBar.textContent = 'Status: Busy, please try again in a moment';
+            } else {
+                const data = await response.json();
+                if (data.position > 1) {
+                    statusBar.textContent = `Status: Queued (position ${data.position})`;
+                }
+            }
         }
     };
 
@@ -34,17 +83,50 @@ document.addEventListener('DOMContentLoaded', () => {
     const startVoiceInput = async () => {
         statusBar.textContent = 'Status: Listening...';
         micButton.disabled = true; // Disable button while listening
-        await fetch('/start_voice', { method: 'POST' });
+        const response = await fetch('/start_voice', { method: 'POST' });
+        if (response.status === 429) {
+            statusBar.textContent = 'Status: Busy, please try again in a moment';
+            micButton.disabled = false;
+        }
     };
 
-    // Poll the backend for updates (new messages, status changes)
+    // Poll the backend for updates (new messages, status changes).
+    // Only one poll runs at a time; a poll requested meanwhile runs right after it.
+    let polling = false;
+    let pollAgain = false;
     const pollForUpdates = async () => {
+        if (polling) {
+            pollAgain = true;
+            return;
+        }
+        polling = true;
+        try {
+            await fetchUpdates();
+        } finally {
+            polling = false;
+            if (pollAgain) {
+                pollAgain = false;
+                pollForUpdates();
+            }
+        }
+    };
+
+    const fetchUpdates = async () => {
+        const since = nextIndex;
         try {
-            const response = await fetch('/updates');
+            const headers = lastETag ? { 'If-None-Match': lastETag } : {};
+            const response = await fetch(`/updates?since=${since}`, { headers });
+            if (response.status === 304) {
+                return; // Nothing changed since the last poll
+            }
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             const data = await response.json();
+            if (since !== nextIndex) {
+                return; // Stale: another response already moved the cursor
+            }
+            lastETag = response.headers.get('ETag');
 
             // Update status and re-enable mic button if not listening
             statusBar.textContent = `Status: ${data.status}`;
@@ -52,15 +134,30 @@ document.addEventListener('DOMContentLoaded', () => {
                 micButton.disabled = false;
             }
 
-            // Update chat messages if there are new ones
-            if (data.chat_history.length !== lastMessageCount) {
-                chatWindow.innerHTML = ''; // Clear and redraw chat
-                data.chat_history.forEach(msg => {
-                    const sender = msg.role === 'user' ? 'You' : 'S.A.R.A.';
-                    addMessage(sender, msg.content);
+            // Server history is shorter than our cursor (e.g. restart): redraw from scratch
+            if (data.reset) {
+                chatWindow.innerHTML = '';
+            }
+
+            // Finished streamed answers are replaced by their final message
+            if (data.messages.length) {
+                partials.forEach((partial, id) => {
+                    if (partial.done) {
+                        partial.div.remove();
+                        partials.delete(id);
+                    }
                 });
-                lastMessageCount = data.chat_history.length;
             }
+
+            // Append only the messages we haven't seen yet
+            data.messages.forEach(msg => {
+                const sender = msg.role === 'user' ? 'You' : 'S.A.R.A.';
+                const messageDiv = addMessage(sender, msg.content);
+                if (msg.image_job) {
+                    watchImageJob(msg.image_job, messageDiv);
+                }
+            });
+            nextIndex = data.next;
         } catch (error) {
             console.error('Polling error:', error);
             statusBar.textContent = 'Status: Connection error';
@@ -68,6 +165,34 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     };
 
+    // Render answer deltas pushed by the server as they are generated
+    const handleStreamEvent = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.type === 'start') {
+            const div = document.createElement('div');
+            div.classList.add('message', 'sara-message', 'streaming');
+            chatWindow.appendChild(div);
+            partials.set(data.id, { div, done: false });
+        } else if (data.type === 'delta') {
+            const partial = partials.get(data.id);
+            if (partial) {
+                partial.div.textContent += data.text;
+                chatWindow.scrollTop = chatWindow.scrollHeight;
+            }
+        } else if (data.type === 'end') {
+            const partial = partials.get(data.id);
+            if (partial) {
+                partial.done = true;
+            }
+            pollForUpdates(); // Fetch the final message right away
+        }
+    };
+
+    if (window.EventSource) {
+        const stream = new EventSource('/stream');
+        stream.onmessage = handleStreamEvent;
+    }
+
     // Event Listeners
     textInput.addEventListener('keydown', (event) => {
         if (event.key === 'Enter') {
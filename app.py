@@ -1,114 +1,414 @@
 
+import time
+_startup_begin = time.perf_counter()
+
 import json
 import os
 import sys
 import threading
 import asyncio
+import itertools
+import queue
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from time import sleep
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g, send_file, abort
 
 # --- SETUP AND PATHS ---
 # Add Backend to Python Path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'Backend')))
 
-# Import backend modules
-from Model import FirstLayerDMM
-from Chatbot import ChatBot
-from RealtimeSearchEngine import RealtimeSearchEngine
-from Automation import Automation, Content
-from SpeechToText import SpeechRecognition
-from TextToSpeech import TextToSpeech
+# Import backend modules. The heavy subsystems (LLM SDKs, browser, audio) are
+# imported on first use; WarmupSubsystems in .env pre-loads them in the background.
+from Config import env_vars
+from Subsystems import LazySubsystem, WarmUp, StartupReport
+from WorkerPool import WorkerPool, QueueFull, PRIORITY_VOICE, PRIORITY_TEXT
+from SessionStore import CreateSessionStore
+from ImageGeneration import ImageJobQueue, StartImageWorkers
+from ImageStore import ThumbnailPath
+from Prefetch import SearchPrefetcher
+from LLMClient import GetLLM
+from Telemetry import REGISTRY, Span, Bind, RecordError, GetTrace
+
+Model = LazySubsystem("Model")
+Chatbot = LazySubsystem("Chatbot")
+RealtimeSearch = LazySubsystem("RealtimeSearchEngine")
+AutomationEngine = LazySubsystem("Automation")
+SpeechToText = LazySubsystem("SpeechToText")
+TextToSpeech = LazySubsystem("TextToSpeech")
+SUBSYSTEMS = [Model, Chatbot, RealtimeSearch, AutomationEngine, SpeechToText, TextToSpeech]
+CORE_IMPORT_SECONDS = time.perf_counter() - _startup_begin
 
 # Initialize Flask App
 app = Flask(__name__, template_folder='Frontend', static_folder='Frontend/static')
 
-# --- SHARED STATE (IN-MEMORY) ---
-app_state = {
-    "status": "Idle",
-    "chat_history": [{"role": "assistant", "content": "Hello! How can I assist you today?"}],
-    "lock": threading.Lock()
-}
+# --- SESSION STATE ---
+# Each browser gets its own status and chat history, keyed by a session cookie.
+# SessionBackend=sqlite in .env lets several server processes share sessions.
+SESSION_COOKIE = "sara_session"
+GREETING = [{"role": "assistant", "content": "Hello! How can I assist you today?"}]
 
-# --- IMAGE GENERATION COMMUNICATION ---
-def trigger_image_generation(prompt):
-    """Writes the prompt to the communication file to trigger the image generation script."""
+sessions = CreateSessionStore(
+    backend=env_vars.get("SessionBackend", "memory"),
+    path=env_vars.get("SessionDatabase", os.path.join("Data", "Sessions.db")),
+    greeting=GREETING,
+)
+
+# Serialized /updates bodies per session for its current version, keyed by the client's cursor.
+# Concurrent pollers at the same version reuse the cached bytes instead of re-encoding.
+_updates_cache = OrderedDict()
+_updates_cache_lock = threading.Lock()
+UPDATES_CACHE_MAX_SESSIONS = 256
+UPDATES_CACHE_MAX_CURSORS = 32
+
+def set_status(session_id, status):
+    """Updates a session's status, bumping its version if it changed."""
+    sessions.set_status(session_id, status)
+
+def append_message(session_id, role, content, **extra):
+    """Appends a chat message (plus any extra fields) to a session and bumps its version."""
+    return sessions.append_message(session_id, {"role": role, "content": content, **extra})
+
+@app.before_request
+def load_session():
+    """Reads the session id cookie, minting a new id for first-time visitors."""
+    session_id = request.cookies.get(SESSION_COOKIE)
+    g.new_session = not session_id
+    g.session_id = session_id or uuid.uuid4().hex
+
+@app.after_request
+def save_session(response):
+    if getattr(g, "new_session", False):
+        response.set_cookie(SESSION_COOKIE, g.session_id, httponly=True, samesite="Lax")
+    return response
+
+# --- WORKER POOLS ---
+# Queries and voice sessions run on a fixed pool fed by a bounded priority queue
+# (voice ahead of text); side work spawned by a query shares a second fixed pool, and
+# speculative searches get their own so they never wait behind (or delay) that work.
+QUERY_WORKERS = 4
+QUERY_QUEUE_SIZE = 32
+BACKGROUND_WORKERS = 8
+# Tasks of one multi-task query (e.g. "general ..., realtime ...") run concurrently, at most
+# TaskParallelism at a time; the task pool is sized so every query worker can use its full cap.
+TASK_PARALLELISM = max(int(env_vars.get("TaskParallelism", 3)), 1)
+
+query_pool = WorkerPool(workers=QUERY_WORKERS, max_queue=QUERY_QUEUE_SIZE, name="query")
+background_pool = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="background")
+task_pool = ThreadPoolExecutor(max_workers=QUERY_WORKERS * TASK_PARALLELISM, thread_name_prefix="task")
+prefetch_pool = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="prefetch")
+
+def queue_full_response(e):
+    """429 reply telling the client the query queue is saturated."""
+    response = jsonify({"status": "busy", "queue_depth": e.depth, "queue_capacity": QUERY_QUEUE_SIZE})
+    response.status_code = 429
+    response.headers["Retry-After"] = "2"
+    return response
+
+# --- TOKEN STREAMING (SERVER-SENT EVENTS) ---
+# Each /stream subscriber gets its own bounded queue; slow consumers drop deltas
+# rather than blocking the LLM thread (the final answer still arrives via /updates).
+# Deltas only reach subscribers of the same session connected to this process.
+_stream_subscribers = {}
+_stream_lock = threading.Lock()
+_stream_ids = itertools.count(1)
+STREAM_QUEUE_SIZE = 1000
+STREAM_HEARTBEAT_SECONDS = 15
+
+def publish_stream_event(session_id, event):
+    """Fans an event dict out to the session's connected /stream subscribers."""
+    with _stream_lock:
+        subscribers = list(_stream_subscribers.get(session_id, ()))
+    for q in subscribers:
+        try:
+            q.put_nowait(event)
+        except queue.Full:
+            pass
+
+def stream_answer(session_id, engine, prompt, speech_order=None, **kwargs):
+    """Runs ChatBot/RealtimeSearchEngine, forwarding each delta to /stream as it arrives
+    and, with TTSPipeline on, to a SpeechPipeline so it is spoken sentence by sentence
+    (at `speech_order`, a (SpeechSequence, place) pair, among the query's answers).
+    The engine answers within `session_id`'s conversation. Returns (answer, stream id, spoken); the
+    caller publishes the stream's end once the answer is in the session history (see publish_stream_end)."""
+    stream_id = next(_stream_ids)
+    publish_stream_event(session_id, {"type": "start", "id": stream_id})
+    speech = None
+
+    def on_token(text):
+        publish_stream_event(session_id, {"type": "delta", "id": stream_id, "text": text})
+        if speech is not None:
+            speech.feed(text)
+
+    answer = None
     try:
-        with open(os.path.join("Frontend", "Files", "ImageGeneration.data"), "w") as f:
-            f.write(f"{prompt},True")
-    except Exception as e:
-        print(f"Error triggering image generation: {e}")
+        speech = speech_pipeline(speech_order)
+        with Span("answer", engine=engine.__name__):
+            answer = engine(prompt, on_token=on_token, session_id=session_id, **kwargs)
+            return answer, stream_id, speech is not None
+    except Exception:
+        publish_stream_end(session_id, stream_id)  # No final message will follow
+        raise
+    finally:
+        if speech is not None:
+            speech.close(fallback=answer)
+
+def publish_stream_end(session_id, stream_id, index=None):
+    """Tells /stream subscribers a streamed answer is over; `index` is its final message's position."""
+    publish_stream_event(session_id, {"type": "end", "id": stream_id, "index": index})
+
+# --- SPOKEN ANSWERS ---
+# With TTSPipeline=true (the default) streamed answers are spoken sentence by sentence
+# while the LLM is still writing; other responses are spoken once complete.
+TTS_PIPELINE = env_vars.get("TTSPipeline", "true").lower() == "true"
+
+def speech_pipeline(order=None):
+    """A SpeechPipeline for a streamed answer, or None when answers are spoken after completion.
+    `order` is an optional (SpeechSequence, place) pair that fixes when it plays."""
+    if not TTS_PIPELINE:
+        return None
+    sequence, place = order or (None, 0)
+    return TextToSpeech.SpeechPipeline(sequence=sequence, place=place)
+
+def speak(text, priority="ANSWER"):
+    """Synthesizes `text` and queues it on the single playback worker at TextToSpeech.PRIORITY_<priority>;
+    returns without waiting for playback, so background workers are never held by the speaker."""
+    TextToSpeech.TextToSpeech(text, priority=getattr(TextToSpeech, f"PRIORITY_{priority}"), wait=False)
+
+# Fixed replies, pre-synthesized into the audio cache at startup when AudioCacheWarm=true
+IMAGE_REPLY = "I'm generating your image. It’ll appear soon."
+UNSURE_REPLY = "I'm not sure how to handle that. Could you rephrase?"
+CANNED_REPLIES = [IMAGE_REPLY, UNSURE_REPLY]
+
+# --- IMAGE GENERATION JOBS ---
+# Prompts go to a FIFO job queue consumed by in-process workers. ImageWorkers=0
+# in .env leaves the queue to the standalone 'Backend/ImageGeneration.py' service.
+IMAGE_WORKERS = int(env_vars.get("ImageWorkers", 2))
+
+image_jobs = ImageJobQueue()
+if IMAGE_WORKERS > 0:
+    StartImageWorkers(image_jobs, workers=IMAGE_WORKERS)
+
+def trigger_image_generation(prompt):
+    """Queues an image generation job and returns its id."""
+    return image_jobs.submit(prompt)
+
+# --- SPECULATIVE SEARCH ---
+# Realtime-looking queries start their web search while the intent is being classified
+# (commands the local fast path recognises never need one).
+prefetcher = SearchPrefetcher(
+    prefetch_pool,
+    lambda query: RealtimeSearch.search_cache.search(query),
+    skip=lambda query: Model.FastMatch(query) is not None,
+)
+
+# --- METRICS ---
+# Stage latencies and errors are recorded by Telemetry spans; the counters that pools,
+# caches and the LLM client already keep are exported at scrape time. Subsystems that
+# haven't been imported yet are skipped rather than loaded by a scrape.
+def _speech_metrics():
+    if not TextToSpeech.loaded:
+        return []
+    stats = TextToSpeech.player.snapshot()
+    return [({"pool": "speech", "state": "queued"}, stats["queued"]),
+            ({"pool": "speech", "state": "active"}, int(stats["playing"]))]
+
+def _voice_metrics():
+    if not SpeechToText.loaded or not hasattr(SpeechToText.recognizer, "snapshot"):
+        return []
+    stats = SpeechToText.recognizer.snapshot()
+    return [({"pool": "voice", "state": "idle"}, stats["idle"]),
+            ({"pool": "voice", "state": "active"}, stats["sessions"] - stats["idle"])]
+
+def _pool_metrics():
+    stats = query_pool.stats()
+    return [({"pool": "query", "state": "queued"}, stats["queue_depth"]),
+            ({"pool": "query", "state": "active"}, stats["active"]),
+            ({"pool": "image", "state": "queued"}, image_jobs.pending())] + _speech_metrics() + _voice_metrics()
+
+def _cache_metrics():
+    samples = []
+    def add(cache, stats, *results):
+        samples.extend(({"cache": cache, "result": r}, stats[r]) for r in results)
+    if Model.loaded:
+        add("fast_path", Model.FastPathReport(), "hits", "misses")
+        add("classification", Model.classification_cache.stats(), "hits", "misses")
+    if RealtimeSearch.loaded:
+        add("search", RealtimeSearch.search_cache.snapshot(), "hits", "misses", "coalesced", "errors")
+    if Chatbot.loaded and Chatbot.answer_cache is not None:
+        add("answer", Chatbot.answer_cache.snapshot(), "exact_hits", "similar_hits", "misses", "coalesced")
+    if TextToSpeech.loaded and TextToSpeech.audio_cache is not None:
+        add("audio", TextToSpeech.audio_cache.snapshot(), "hits", "misses", "coalesced")
+    if SpeechToText.loaded:
+        add("translation", SpeechToText.translator.snapshot(), "skipped", "hits", "misses", "coalesced")
+    add("prefetch", prefetcher.report(), "handed_off", "wasted", "failed")
+    return samples
+
+def _llm_metrics(field):
+    def collect():
+        samples = []
+        for key, stats in GetLLM().usage().items():
+            provider, model = key.split("/", 1)
+            samples.append(({"provider": provider, "model": model}, stats[field]))
+        return samples
+    return collect
+
+REGISTRY.collect("sara_pool_tasks", "Queued and running work per pool.", "gauge", _pool_metrics)
+REGISTRY.collect("sara_queue_rejected_total", "Queries refused because the queue was full.", "counter",
+                 lambda: [({"pool": "query"}, query_pool.stats()["rejected"])])
+REGISTRY.collect("sara_cache_requests_total", "Cache lookups per cache and result.", "counter", _cache_metrics)
+REGISTRY.collect("sara_stream_subscribers", "Connected /stream clients.", "gauge",
+                 lambda: [({}, sum(len(v) for v in list(_stream_subscribers.values())))])
+for _field, _description in [("calls", "LLM requests sent, including retries."),
+                             ("errors", "LLM requests that failed."),
+                             ("retries", "LLM requests retried."),
+                             ("prompt_tokens", "LLM prompt tokens."),
+                             ("completion_tokens", "LLM completion tokens."),
+                             ("throttled_seconds", "Time spent waiting on LLM rate limits.")]:
+    REGISTRY.collect(f"sara_llm_{_field}_total", _description, "counter", _llm_metrics(_field))
 
 # --- CORE PROCESSING LOGIC ---
-def process_query(query):
-    """Processes a user query: classification → execution."""
+def run_automation(call):
+    """Runs an automation call (sync or async) on the background pool as an 'automation' span."""
+    with Span("automation"):
+        result = call()
+        return asyncio.run(result) if asyncio.iscoroutine(result) else result
+
+def execute_task(session_id, task, prefetched=None, speech_order=None):
+    """Runs one classified task and returns (response, extra message fields, already spoken).
+    A streamed answer is spoken at `speech_order` (see stream_answer)."""
+    # --- General Chat ---
+    if task.startswith("general"):
+        prompt = task.replace("general", "").strip()
+        answer, stream_id, spoken = stream_answer(session_id, Chatbot.ChatBot, prompt, speech_order=speech_order)
+        return answer, {"stream": stream_id}, spoken
+
+    # --- Realtime Query ---
+    if task.startswith("realtime"):
+        prompt = task.replace("realtime", "").strip()
+        search_results = prefetcher.result(prefetched) if prefetched else None
+        answer, stream_id, spoken = stream_answer(session_id, RealtimeSearch.RealtimeSearchEngine, prompt,
+                                                  speech_order=speech_order, search_results=search_results)
+        return answer, {"stream": stream_id}, spoken
+
+    # --- Content Generation ---
+    if task.startswith("content"):
+        prompt = task.replace("content", "").strip()
+        background_pool.submit(Bind(run_automation), lambda: AutomationEngine.Content(prompt))
+        return f"I've generated content on '{prompt}' and opened it in Notepad.", {}, False
+
+    # --- Image Generation ---
+    if task.startswith("generate image"):
+        prompt = task.replace("generate image", "").strip()
+        job_id = trigger_image_generation(prompt)
+        return IMAGE_REPLY, {"image_job": job_id}, False
+
+    # --- Automation / System Control / App Opening ---
+    # ✅ FIXED: Properly await async Automation() inside a thread
+    background_pool.submit(Bind(run_automation), lambda: AutomationEngine.Automation([task]))
+    return f"Executing your command: {task}", {}, False
+
+def safe_execute_task(session_id, task, prefetched=None, speech_order=None):
+    """execute_task() that turns a failure into an apology, so sibling tasks still complete.
+    The task's trace and span ids are added to its message fields."""
+    span = Span("task", task=task)
     try:
-        with app_state["lock"]:
-            app_state["status"] = "Thinking..."
-            app_state["chat_history"].append({"role": "user", "content": query})
-
-        # Classify user intent
-        tasks = FirstLayerDMM(query)
-        print(f"Tasks classified: {tasks}")
-
-        if not tasks:
-            response = "I'm not sure how to handle that. Could you rephrase?"
-            with app_state["lock"]:
-                app_state["chat_history"].append({"role": "assistant", "content": response})
-            threading.Thread(target=TextToSpeech, args=(response,)).start()
+        with span:
+            response, extra, spoken = execute_task(session_id, task, prefetched, speech_order)
+    except Exception as e:
+        print(f"[ERROR] task '{task}': {e}")
+        response, extra, spoken = "Sorry, I couldn't complete that part of your request.", {}, False
+    return response, dict(extra, trace=span.trace_id, span=span.span_id), spoken
+
+def run_tasks(session_id, tasks, prefetched=None):
+    """Runs tasks concurrently (up to TASK_PARALLELISM) and emits each result in the original
+    task order as soon as every earlier task has finished. `prefetched` maps a task to its
+    speculative search. Streamed answers are spoken in task order too, whichever is ready first."""
+    prefetched = prefetched or {}
+    pending = iter(enumerate(tasks))
+    in_flight = {}
+    finished = {}
+    next_index = 0
+    places = {}  # Task index -> place in `sequence` of a streamed answer
+
+    if TTS_PIPELINE:
+        for index, task in enumerate(tasks):
+            if task.startswith(("general", "realtime")):
+                places[index] = len(places)
+    if len(places) < 2:
+        places = {}  # A lone answer has nothing to wait for
+    sequence = TextToSpeech.SpeechSequence() if places else None
+
+    def submit_next():
+        for index, task in pending:
+            order = (sequence, places[index]) if index in places else None
+            in_flight[task_pool.submit(Bind(safe_execute_task), session_id, task, prefetched.get(task), order)] = index
             return
 
-        # Execute tasks
-        for task in tasks:
-            response = ""
-
-            # --- General Chat ---
-            if task.startswith("general"):
-                prompt = task.replace("general", "").strip()
-                response = ChatBot(prompt)
-
-            # --- Realtime Query ---
-            elif task.startswith("realtime"):
-                prompt = task.replace("realtime", "").strip()
-                response = RealtimeSearchEngine(prompt)
-
-            # --- Content Generation ---
-            elif task.startswith("content"):
-                prompt = task.replace("content", "").strip()
-                threading.Thread(target=Content, args=(prompt,)).start()
-                response = f"I've generated content on '{prompt}' and opened it in Notepad."
-
-            # --- Image Generation ---
-            elif task.startswith("generate image"):
-                prompt = task.replace("generate image", "").strip()
-                trigger_image_generation(prompt)
-                response = "I'm generating your image. It’ll appear soon."
-
-            # --- Automation / System Control / App Opening ---
-            else:
-                # ✅ FIXED: Properly await async Automation() inside a thread
-                threading.Thread(target=lambda: asyncio.run(Automation([task]))).start()
-                response = f"Executing your command: {task}"
+    for _ in range(TASK_PARALLELISM):
+        submit_next()
+
+    while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = in_flight.pop(future)
+            finished[index] = future.result()
+            if index in places and not finished[index][2]:
+                # It failed before its pipeline existed: later answers must not wait for it
+                TextToSpeech.player.skip(sequence, places[index])
+            submit_next()
 
-            # --- Save and Speak Response ---
+        # --- Save and Speak Responses, in task order ---
+        while next_index in finished:
+            response, extra, spoken = finished.pop(next_index)
+            next_index += 1
+            stream_id = extra.pop("stream", None)
+            index = append_message(session_id, "assistant", response, **extra) if response else None
+            if stream_id is not None:
+                # Only now can the client's catch-up poll find the final message
+                publish_stream_end(session_id, stream_id, index)
             if response:
-                with app_state["lock"]:
-                    app_state["chat_history"].append({"role": "assistant", "content": response})
 
-                # Run Text-to-Speech in background
-                threading.Thread(target=TextToSpeech, args=(response,)).start()
+                # Run Text-to-Speech in background (streamed answers were spoken as they arrived);
+                # command confirmations queue behind answers
+                if not spoken:
+                    is_answer = tasks[next_index - 1].startswith(("general", "realtime"))
+                    background_pool.submit(Bind(speak), response, "ANSWER" if is_answer else "NOTICE")
 
-    except Exception as e:
-        print(f"[ERROR] process_query: {e}")
-        with app_state["lock"]:
-            app_state["status"] = "Error"
-            app_state["chat_history"].append({
-                "role": "assistant",
-                "content": "Sorry, an unexpected error occurred."
-            })
+def process_query(session_id, query):
+    """Processes a user query for one session: classification → execution.
+    The query is one trace; its messages carry the trace id and the id of the span that produced them."""
+    with Span("query", new_trace=True) as query_span:
+        ids = {"trace": query_span.trace_id, "span": query_span.span_id}
+        try:
+            set_status(session_id, "Thinking...")
+            append_message(session_id, "user", query, **ids)
 
-    finally:
-        with app_state["lock"]:
-            app_state["status"] = "Idle"
+            # Classify user intent, overlapping a speculative web search for realtime-looking queries
+            prefetch = prefetcher.start(query)
+            with Span("classify"):
+                tasks = Model.FirstLayerDMM(query)
+            print(f"Tasks classified: {tasks} (trace {query_span.trace_id})")
+            prefetched = prefetcher.claim(prefetch, tasks or [], query)
+
+            if not tasks:
+                response = UNSURE_REPLY
+                append_message(session_id, "assistant", response, **ids)
+                background_pool.submit(Bind(speak), response, "URGENT")
+                return
+
+            # Execute tasks
+            run_tasks(session_id, tasks, prefetched)
+
+        except Exception as e:
+            print(f"[ERROR] process_query: {e}")
+            RecordError("query")
+            set_status(session_id, "Error")
+            append_message(session_id, "assistant", "Sorry, an unexpected error occurred.", **ids)
+
+        finally:
+            set_status(session_id, "Idle")
 
 # --- FLASK ROUTES ---
 @app.route('/')
@@ -121,44 +421,213 @@ def handle_query():
     """Handle text query from frontend."""
     data = request.json
     query = data.get('query')
-    if query:
-        threading.Thread(target=process_query, args=(query,)).start()
-    return jsonify({"status": "received"})
+    if not query:
+        return jsonify({"status": "ignored"})
+    try:
+        position = query_pool.submit(process_query, g.session_id, query, priority=PRIORITY_TEXT)
+    except QueueFull as e:
+        return queue_full_response(e)
+    return jsonify({"status": "received", "position": position})
 
 @app.route('/start_voice', methods=['POST'])
 def handle_voice():
     """Handle voice input request."""
-    def voice_thread():
-        with app_state["lock"]:
-            app_state["status"] = "Listening..."
+    # Barge-in: the assistant stops talking as soon as the user wants to speak
+    if TextToSpeech.loaded:
+        TextToSpeech.Interrupt()
+
+    def voice_thread(session_id):
+        set_status(session_id, "Listening...")
 
         try:
-            voice_query = SpeechRecognition()
+            with Span("voice.recognition"):
+                voice_query = SpeechToText.SpeechRecognition(on_status=lambda status: set_status(session_id, status))
             if voice_query:
-                process_query(voice_query)
+                process_query(session_id, voice_query)
             else:
-                with app_state["lock"]:
-                    app_state["status"] = "Idle"
+                set_status(session_id, "Idle")
         except Exception as e:
             print(f"Error during voice recognition: {e}")
-            with app_state["lock"]:
-                app_state["status"] = "Error"
+            set_status(session_id, "Error")
+
+    try:
+        position = query_pool.submit(voice_thread, g.session_id, priority=PRIORITY_VOICE)
+    except QueueFull as e:
+        return queue_full_response(e)
+    return jsonify({"status": "listening", "position": position})
+
+@app.route('/queue')
+def queue_status():
+    """Expose worker pool depth and utilisation for sizing."""
+    return jsonify(query_pool.stats())
 
-    threading.Thread(target=voice_thread).start()
-    return jsonify({"status": "listening"})
+@app.route('/classifier')
+def classifier_status():
+    """Expose the local fast-path classifier and classification cache hit rates."""
+    return jsonify(Model.ClassifierReport())
+
+@app.route('/prefetch')
+def prefetch_status():
+    """Expose speculative search hit and waste rates."""
+    return jsonify(prefetcher.report())
+
+@app.route('/llm')
+def llm_usage():
+    """Expose LLM calls, retries, token usage and rate-limit waits per provider/model."""
+    return jsonify(GetLLM().usage())
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint: stage latency histograms, errors, caches, queues and threads."""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/traces/<trace_id>')
+def trace_spans(trace_id):
+    """Spans of a recent query, looked up by the trace id stored on its chat messages."""
+    spans = GetTrace(trace_id)
+    if spans is None:
+        abort(404)
+    return jsonify({"trace": trace_id, "spans": spans})
+
+def _render_updates(session_id, since):
+    """Returns (version, body) for the messages after `since`, reusing cached bytes per version."""
+    version = sessions.version(session_id)
+    with _updates_cache_lock:
+        cached = _updates_cache.get(session_id)
+        if cached and cached["version"] == version and since in cached["bodies"]:
+            return version, cached["bodies"][since]
+
+    # The store copies the delta under the session lock; encode outside it
+    snapshot = sessions.snapshot(session_id, since)
+    reset = since > snapshot["total"]
+    if reset:
+        snapshot = sessions.snapshot(session_id, 0)
+    version = snapshot["version"]
+    body = json.dumps({
+        "version": version,
+        "status": snapshot["status"],
+        "since": 0 if reset else since,
+        "next": snapshot["total"],
+        "reset": reset,
+        "messages": snapshot["messages"],
+    })
+
+    with _updates_cache_lock:
+        cached = _updates_cache.get(session_id)
+        if cached is None or cached["version"] != version:
+            cached = _updates_cache[session_id] = {"version": version, "bodies": {}}
+        _updates_cache.move_to_end(session_id)
+        while len(_updates_cache) > UPDATES_CACHE_MAX_SESSIONS:
+            _updates_cache.popitem(last=False)
+        if len(cached["bodies"]) < UPDATES_CACHE_MAX_CURSORS:
+            cached["bodies"][since] = body
+    return version, body
 
 @app.route('/updates')
 def get_updates():
-    """Send live status + chat history to frontend."""
-    with app_state["lock"]:
-        return jsonify({
-            "status": app_state["status"],
-            "chat_history": app_state["chat_history"]
-        })
+    """Send live status + new chat messages after the client's cursor (?since=<index>)."""
+    since = max(request.args.get("since", default=0, type=int), 0)
+
+    etag = f"{sessions.version(g.session_id)}-{since}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    version, body = _render_updates(g.session_id, since)
+    response = Response(body, mimetype="application/json")
+    response.set_etag(f"{version}-{since}")
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route('/images/<job_id>')
+def image_job_status(job_id):
+    """Status of an image generation job, with URLs of its images and their thumbnails once done."""
+    job = image_jobs.get(job_id)
+    if job is None:
+        abort(404)
+    count = len(job.pop("files"))
+    job["images"] = [f"/images/{job_id}/{i}" for i in range(count)]
+    job["thumbnails"] = [f"/images/{job_id}/{i}/thumb" for i in range(count)]
+    return jsonify(job)
+
+def _job_image_path(job_id, index):
+    job = image_jobs.get(job_id)
+    if job is None or not 0 <= index < len(job["files"]):
+        abort(404)
+    path = os.path.abspath(job["files"][index])
+    if not os.path.exists(path):
+        abort(404)  # Evicted from the image store
+    return path
+
+@app.route('/images/<job_id>/<int:index>')
+def image_file(job_id, index):
+    """Serve one generated image of a finished job."""
+    return send_file(_job_image_path(job_id, index), mimetype="image/jpeg", max_age=86400)
+
+@app.route('/images/<job_id>/<int:index>/thumb')
+def image_thumbnail(job_id, index):
+    """Serve the WebP thumbnail of a generated image, or the image itself if it has none."""
+    path = _job_image_path(job_id, index)
+    thumbnail = ThumbnailPath(path)
+    if os.path.exists(thumbnail):
+        return send_file(thumbnail, mimetype="image/webp", max_age=86400)
+    return send_file(path, mimetype="image/jpeg", max_age=86400)
+
+@app.route('/stream')
+def stream_updates():
+    """Server-Sent Events channel pushing answer deltas as the LLM produces them."""
+    session_id = g.session_id
+    q = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    with _stream_lock:
+        _stream_subscribers.setdefault(session_id, []).append(q)
+
+    def events():
+        try:
+            while True:
+                try:
+                    event = q.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            with _stream_lock:
+                _stream_subscribers[session_id].remove(q)
+                if not _stream_subscribers[session_id]:
+                    del _stream_subscribers[session_id]
+
+    response = Response(stream_with_context(events()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 # --- MAIN EXECUTION ---
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="S.A.R.A. web server")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="import and warm every subsystem, print the cost of each, and exit")
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        print(f"Core imports (Flask, stores, job queue): {CORE_IMPORT_SECONDS * 1000:.1f} ms\n")
+        WarmUp(SUBSYSTEMS, background=False)
+        print(StartupReport(SUBSYSTEMS))
+        sys.exit(0)
+
     print("\n--- S.A.R.A. INITIALIZING ---")
-    print("IMPORTANT: Run 'Backend/ImageGeneration.py' in another terminal if you use image generation.")
+    warmup_names = [n.strip() for n in env_vars.get("WarmupSubsystems", "").split(",") if n.strip()]
+    warmup = [s for s in SUBSYSTEMS if s.name in warmup_names]
+    if warmup:
+        print(f"Warming up in the background: {', '.join(s.name for s in warmup)}")
+        WarmUp(warmup)
+    if SpeechToText not in warmup and env_vars.get("VoiceWarmup", "true").lower() == "true":
+        # Chrome takes seconds to start; without this the first voice request would wait for it
+        WarmUp([SpeechToText])
+    if env_vars.get("AudioCacheWarm", "false").lower() == "true":
+        background_pool.submit(lambda: TextToSpeech.PrewarmAudio(CANNED_REPLIES))
+    if IMAGE_WORKERS == 0:
+        print("IMPORTANT: ImageWorkers=0, run 'Backend/ImageGeneration.py' in another terminal for image generation.")
     print("Open your browser and visit: http://127.0.0.1:5000\n")
     app.run(host='127.0.0.1', port=5000, debug=False)
\ No newline at end of file
@@ -0,0 +1,402 @@
+"""Offline end-to-end latency benchmark for the query pipeline.
+
+Runs app.process_query (FirstLayerDMM -> ChatBot / RealtimeSearchEngine / Automation
+-> TextToSpeech) against deterministic local stand-ins for Cohere, Groq, web search,
+TTS, automation and image jobs, with configurable injected latency, and prints
+p50/p95/p99 per stage and end to end (including time to first audio) as JSON:
+
+    python benchmark.py --iterations 20 --llm-ttft 0.3 --search-latency 0.8 > before.json
+
+TextToSpeech is the real module with only synthesis and playback replaced, so
+sentence pipelining is measured too (pygame and edge_tts must be importable).
+
+With --voice each query is first "heard" through SpeechToText with a FileRecognizer
+replaying the corpus, and the recognition wall time and CPU time are reported too.
+
+Queries run one at a time so stage timings are not distorted by contention. By
+default every iteration starts with empty classification/search/answer caches and
+an empty chat log; --warm-caches keeps the caches across iterations instead.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import defaultdict
+from concurrent.futures import wait
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'Backend')))
+
+# (query, what the Cohere stand-in classifies it as); commands the local fast path
+# recognises never reach the stand-in
+CORPUS = [
+    ("what is python programming language", "general what is python programming language"),
+    ("how are you today", "general how are you today"),
+    ("explain how a transformer neural network works", "general explain how a transformer neural network works"),
+    ("tell me a joke about computers", "general tell me a joke about computers"),
+    ("who won the cricket match today", "realtime who won the cricket match today"),
+    ("what is the latest news about SpaceX", "realtime what is the latest news about SpaceX"),
+    ("tell me about Elon Musk", "realtime tell me about Elon Musk"),
+    ("open chrome", "open chrome"),
+    ("open notepad and play despacito", "open notepad, play despacito"),
+    ("volume up", "system volume up"),
+    ("write an application for sick leave", "content application for sick leave"),
+    ("generate an image of a lion in the jungle", "generate image a lion in the jungle"),
+    ("what is machine learning and what is the weather in delhi",
+     "general what is machine learning, realtime what is the weather in delhi"),
+    ("google search python tutorials", "google search python tutorials"),
+]
+
+UNLIMITED = {"rpm": 10 ** 9, "tpm": 10 ** 12}
+
+
+# --- MEASUREMENT ---
+
+class Recorder:
+    """Thread-safe collection of duration samples per stage."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def timed(self, stage, fn):
+        """Wraps `fn` so each call records its duration under `stage`."""
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return wrapper
+
+
+def Percentile(sorted_values, fraction):
+    """Linearly interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def Summarize(samples):
+    """Milliseconds count/mean/p50/p95/p99/max per stage."""
+    report = {}
+    for stage in sorted(samples):
+        values = sorted(samples[stage])
+        report[stage] = {
+            "count": len(values),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3),
+            "p50_ms": round(Percentile(values, 0.50) * 1000, 3),
+            "p95_ms": round(Percentile(values, 0.95) * 1000, 3),
+            "p99_ms": round(Percentile(values, 0.99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3),
+        }
+    return report
+
+
+class TrackingExecutor:
+    """Executor wrapper that remembers the futures submitted during the current query,
+    so background TTS and automation can be included in the end-to-end time."""
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.futures = []
+        self.finished_at = []
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        def run():
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.finished_at.append(time.perf_counter())
+        future = self.executor.submit(run)
+        with self._lock:
+            self.futures.append(future)
+        return future
+
+    def drain(self):
+        """Waits for this query's background work; returns when the last piece finished."""
+        wait(self.futures)
+        with self._lock:
+            finished = max(self.finished_at, default=None)
+            self.futures, self.finished_at = [], []
+        return finished
+
+
+# --- STAND-INS ---
+
+def MakeLLM(recorder, corpus, args):
+    """LLMClient over LocalProvider stand-ins, without rate limits, timing TTFT and totals."""
+    from LLMClient import LLMClient, LocalProvider, RATE_LIMITS
+
+    classifications = {query: label for query, label in corpus}
+    # Sentences of twelve words, so speech can be pipelined sentence by sentence
+    words = ["word." if (i + 1) % 12 == 0 else "word" for i in range(max(args.answer_words - 1, 0))]
+    answer = " ".join(words + ["done."])
+
+    def classify(model, request):
+        return classifications.get(request["message"], f"general {request['message']}")
+
+    class TimedLLMClient(LLMClient):
+        def stream(self, provider, model, **request):
+            start = time.perf_counter()
+            first = None
+            for delta in super().stream(provider, model, **request):
+                if first is None:
+                    first = time.perf_counter()
+                    recorder.add(f"llm.{provider}.ttft", first - start)
+                yield delta
+            recorder.add(f"llm.{provider}.total", time.perf_counter() - start)
+
+    providers = {
+        "cohere": LocalProvider(classify, ttft=args.classify_ttft, token_delay=args.token_delay),
+        "groq": LocalProvider(lambda model, request: answer, ttft=args.llm_ttft, token_delay=args.token_delay),
+    }
+    return TimedLLMClient(providers, rate_limits={key: UNLIMITED for key in RATE_LIMITS})
+
+
+class AudioClock:
+    """When the current query was submitted, first became audible and last stopped speaking."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.query_start = time.perf_counter()
+        self.first_audio = None
+        self.last_audio_end = None
+
+
+def InstallSpeechStandIns(tts, recorder, clock, args):
+    """Replaces edge_tts synthesis and pygame playback in the real TextToSpeech module and
+    keeps every SpeechPipeline so the run can wait for it."""
+    pipelines = []
+    real_pipeline = tts.SpeechPipeline
+
+    def Synthesize(text):
+        start = time.perf_counter()
+        time.sleep(args.tts_latency)
+        recorder.add("tts.synthesis", time.perf_counter() - start)
+        return text.encode("utf-8")
+
+    def PlayAudio(audio, func=lambda r=None: True):
+        start = time.perf_counter()
+        if clock.first_audio is None:
+            clock.first_audio = start
+        time.sleep(len(audio) * args.playback_per_char)
+        clock.last_audio_end = time.perf_counter()
+        recorder.add("tts.playback", clock.last_audio_end - start)
+        return True
+
+    def SpeechPipeline(*args, **kwargs):
+        pipeline = real_pipeline(*args, **kwargs)
+        pipelines.append(pipeline)
+        return pipeline
+
+    tts.Synthesize = Synthesize
+    tts.PlayAudio = PlayAudio
+    tts.SpeechPipeline = SpeechPipeline
+    return pipelines
+
+
+def MakeAutomation(recorder, args):
+    """Stand-in for Automation that only sleeps instead of opening apps or files."""
+    async def Automation(commands):
+        start = time.perf_counter()
+        await asyncio.sleep(args.automation_latency)
+        recorder.add("automation", time.perf_counter() - start)
+        return True
+
+    def Content(prompt):
+        start = time.perf_counter()
+        time.sleep(args.llm_ttft + args.automation_latency)
+        recorder.add("automation", time.perf_counter() - start)
+        return True
+
+    return types.SimpleNamespace(Automation=Automation, Content=Content)
+
+
+# --- RUN ---
+
+def ResetState(app, reset_caches):
+    """Gives the next iteration a fresh chat log and, unless caches are kept, empty caches.
+    (Each iteration also runs in its own session, whose log and summary start empty.)"""
+    import ChatLogStore
+    from Model import ClassificationCache
+    from SearchCache import SearchCache
+    from AnswerCache import AnswerCache
+
+    with ChatLogStore._chat_log_lock:
+        ChatLogStore._chat_logs.clear()
+    if not reset_caches:
+        return
+    model = app.Model.load()
+    old = model.classification_cache
+    model.classification_cache = ClassificationCache(old.maxsize, old.ttl, "")
+    search = app.RealtimeSearch.load()
+    search.search_cache = SearchCache(provider=search.search_cache.provider, ttls=search.search_cache.ttls,
+                                      max_bytes=search.search_cache.max_bytes)
+    chatbot = app.Chatbot.load()
+    if chatbot.answer_cache is not None:
+        old = chatbot.answer_cache
+        chatbot.answer_cache = AnswerCache(old.maxsize, old.ttl, old.similarity)
+
+
+def RunBenchmark(args):
+    """Runs the benchmark and returns its report. Call it with stdout redirected: the app's
+    modules print while importing and running, and stdout is reserved for the JSON report."""
+    # Must be applied before app (and the Backend modules) read their configuration
+    from Config import env_vars
+
+    workdir = tempfile.mkdtemp(prefix="sara-bench-")
+    env_vars.update({
+        "SessionBackend": "memory",
+        "ImageWorkers": "0",
+        "ClassificationCacheFile": "",
+        "AnswerCache": "true" if args.answer_cache else "false",
+        "TTSPipeline": "false" if args.no_tts_pipeline else "true",
+        "InputLanguage": "en-US",
+        "VoiceSilence": str(args.voice_silence),
+        # Every on-disk store lives in the temp dir, never under the repo's Data/
+        "ImageJobsDatabase": os.path.join(workdir, "ImageJobs.db"),
+        "ImageStoreDir": os.path.join(workdir, "Images"),
+        "AudioCacheDir": os.path.join(workdir, "AudioCache"),
+        "ChatLogDir": os.path.join(workdir, "ChatLog"),
+    })
+
+    import app
+    from LLMClient import SetLLM
+    from SearchCache import FakeSearchProvider
+
+    recorder = Recorder()
+    corpus = CORPUS
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            corpus = [tuple(item) for item in json.load(f)]
+
+    # --- Stand-ins and instrumentation ---
+    SetLLM(MakeLLM(recorder, corpus, args))
+    clock = AudioClock()
+    pipelines = InstallSpeechStandIns(app.TextToSpeech.load(), recorder, clock, args)
+    app.AutomationEngine = MakeAutomation(recorder, args)
+    background = app.background_pool = TrackingExecutor(app.background_pool)
+
+    model = app.Model.load()
+    model.FirstLayerDMM = recorder.timed("classify", model.FirstLayerDMM)
+    search = app.RealtimeSearch.load()
+    provider = FakeSearchProvider(latency=args.search_latency)
+    provider.search = recorder.timed("search", provider.search)
+    search.search_cache.provider = provider
+    search.RealtimeSearchEngine = recorder.timed("answer.realtime", search.RealtimeSearchEngine)
+    chatbot = app.Chatbot.load()
+    chatbot.ChatBot = recorder.timed("answer.general", chatbot.ChatBot)
+    if args.voice:
+        from SpeechToText import FileRecognizer
+        transcripts = os.path.join(workdir, "voice.txt")
+        with open(transcripts, "w", encoding="utf-8") as f:
+            f.write("\n".join(query for query, _ in corpus) + "\n")
+        speech_to_text = app.SpeechToText.load()
+        speech_to_text.SetRecognizer(FileRecognizer(transcripts, latency=args.voice_latency))
+
+    # --- Timed passes over the corpus ---
+    for iteration in range(args.warmup + args.iterations):
+        measuring = iteration >= args.warmup
+        if iteration == args.warmup:
+            recorder.samples.clear()
+        ResetState(app, reset_caches=not args.warm_caches)
+        for query, _ in corpus:
+            session_id = f"bench-{iteration}"
+            if args.voice:
+                # The transcript is only timed; the corpus query is processed so classifications match
+                wall, cpu = time.perf_counter(), time.process_time()
+                speech_to_text.SpeechRecognition()
+                if measuring:
+                    recorder.add("voice.recognition", time.perf_counter() - wall)
+                    recorder.add("voice.cpu", time.process_time() - cpu)
+            clock.reset()
+            start = clock.query_start
+            app.process_query(session_id, query)
+            pipeline_end = time.perf_counter()
+            background_end = background.drain()
+            for speech in pipelines:
+                speech.wait()
+            pipelines.clear()
+            app.TextToSpeech.player.drain()  # speak() queues replies without waiting for them
+            if measuring:
+                recorder.add("pipeline", pipeline_end - start)
+                recorder.add("end_to_end", max(pipeline_end, background_end or 0.0,
+                                               clock.last_audio_end or 0.0) - start)
+                if clock.first_audio is not None:
+                    recorder.add("first_audio", clock.first_audio - start)
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "queries": len(corpus),
+        "stages": Summarize(recorder.samples),
+        "llm_usage": app.GetLLM().usage(),
+        "prefetch": app.prefetcher.report(),
+        "classifier": model.ClassifierReport(),
+        "search_cache": search.search_cache.snapshot(),
+    }
+    if chatbot.answer_cache is not None:
+        report["answer_cache"] = chatbot.answer_cache.snapshot()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline latency benchmark for the S.A.R.A. query pipeline")
+    parser.add_argument("--iterations", type=int, default=10, help="timed passes over the corpus")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed passes run first (imports, thread pools)")
+    parser.add_argument("--corpus", help="JSON list of [query, classification] pairs (default: built-in corpus)")
+    parser.add_argument("--classify-ttft", type=float, default=0.25, help="Cohere stand-in time to first token (s)")
+    parser.add_argument("--llm-ttft", type=float, default=0.35, help="Groq stand-in time to first token (s)")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="delay between streamed words (s)")
+    parser.add_argument("--answer-words", type=int, default=60, help="words per Groq stand-in answer")
+    parser.add_argument("--search-latency", type=float, default=0.8, help="web search stand-in latency (s)")
+    parser.add_argument("--tts-latency", type=float, default=0.6, help="speech synthesis stand-in latency (s)")
+    parser.add_argument("--playback-per-char", type=float, default=0.06, help="simulated playback time per character (s)")
+    parser.add_argument("--automation-latency", type=float, default=0.05, help="automation stand-in latency (s)")
+    parser.add_argument("--warm-caches", action="store_true", help="keep classification/search/answer caches across iterations")
+    parser.add_argument("--answer-cache", action="store_true", help="enable the ChatBot answer cache")
+    parser.add_argument("--no-tts-pipeline", action="store_true", help="speak answers only once complete (TTSPipeline=false)")
+    parser.add_argument("--voice", action="store_true", help="recognize each query through SpeechToText's offline FileRecognizer first")
+    parser.add_argument("--voice-latency", type=float, default=1.5, help="simulated speaking time per voice query (s)")
+    parser.add_argument("--voice-silence", type=float, default=0.5, help="silence that ends a voice query (s)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    # Everything the app prints (config warnings, the pygame banner, logs from worker
+    # threads) goes to stderr for the whole run; only the report is written to stdout
+    stdout = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        report = RunBenchmark(args)
+        text = json.dumps(report, indent=2, sort_keys=True)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+        else:
+            stdout.write(text + "\n")
+        # The app's worker pools are non-daemon; don't wait for idle threads
+        stdout.flush()
+        sys.stderr.flush()
+        os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""End-to-end check of a general query: /query -> classification -> ChatBot -> /stream.
+
+Runs the real Flask app with the offline LLM stand-in (LLMBackend=local) and every
+on-disk store in a temp dir:  python -m pytest -q tests
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Backend"))
+
+from Config import env_vars
+
+WORKDIR = tempfile.mkdtemp(prefix="sara-test-")
+env_vars.update({
+    "LLMBackend": "local",
+    "SessionBackend": "memory",
+    "ImageWorkers": "0",
+    "AnswerCache": "false",
+    "TTSPipeline": "false",
+    "ClassificationCacheFile": "",
+    "ImageJobsDatabase": os.path.join(WORKDIR, "ImageJobs.db"),
+    "ImageStoreDir": os.path.join(WORKDIR, "Images"),
+    "AudioCacheDir": os.path.join(WORKDIR, "AudioCache"),
+    "ChatLogDir": os.path.join(WORKDIR, "ChatLog"),
+})
+
+import app as server  # noqa: E402  (the settings above must be in place first)
+from ChatLogStore import GetChatLog  # noqa: E402
+
+
+def ReadEvents(response, until="end", timeout=30.0):
+    """Parses SSE `data:` lines from a streaming response until an event of type `until`
+    (or `timeout` seconds pass, for a query that never produces one)."""
+    events = []
+    reader = threading.Thread(target=_read, args=(response, until, events), daemon=True)
+    reader.start()
+    reader.join(timeout)
+    return list(events)
+
+
+def _read(response, until, events):
+    buffer = ""
+    for chunk in response.response:
+        buffer += chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        while "\n\n" in buffer:
+            frame, buffer = buffer.split("\n\n", 1)
+            if frame.startswith("data: "):
+                events.append(json.loads(frame[len("data: "):]))
+                if events[-1]["type"] == until:
+                    return
+
+
+class StreamGeneralQueryTest(unittest.TestCase):
+    def setUp(self):
+        server.speak = lambda text, priority="ANSWER": None  # No audio device in tests
+        server.STREAM_HEARTBEAT_SECONDS = 0.1  # The test client waits for the first chunk
+        self.client = server.app.test_client()
+
+    def test_general_query_streams_answer_and_saves_turn(self):
+        stream = self.client.get("/stream", buffered=False)
+        self.assertEqual(stream.status_code, 200)
+        session_id = self.client.get_cookie(server.SESSION_COOKIE).value
+
+        reply = self.client.post("/query", json={"query": "what is the meaning of love"})
+        self.assertEqual(reply.get_json()["status"], "received")
+
+        events = ReadEvents(stream)
+        self.assertTrue(events, "no /stream events for a general query")
+        self.assertEqual(events[0]["type"], "start")
+        self.assertEqual(events[-1]["type"], "end")
+        answer = "".join(e["text"] for e in events if e["type"] == "delta")
+        self.assertEqual(answer, "This is an offline answer to: what is the meaning of love")
+
+        # The final message is in the session history at the index the end event announced
+        snapshot = server.sessions.snapshot(session_id)
+        self.assertEqual(snapshot["messages"][events[-1]["index"]]["content"], answer)
+        # ...and the turn went to this session's chat log only
+        self.assertEqual(GetChatLog(session_id).recent()[-1], {"role": "assistant", "content": answer})
+        self.assertEqual(GetChatLog("another-session").recent(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()